@@ -6,17 +6,34 @@ import sqlite3
 import logging
 import shutil
 import acoustid
-import difflib
 import mutagen
 import traceback
 import json
 import hashlib
 import multiprocessing
+import heapq
+import zlib
+from functools import lru_cache
 from mutagen.id3 import ID3, TPE1, TPE2, TRCK, TPOS, TIT2, TALB
 from tqdm import tqdm
+from rapidfuzz import fuzz, process
 import musicbrainzngs  # <--- NEW
 import mutagen.easyid3  # <--- NEW
 
+# Optional: bitwise fingerprint comparison needs numpy and libchromaprint.
+# Without them, similarity falls back to RapidFuzz on the encoded text.
+try:
+    import numpy as np
+    import chromaprint
+except ImportError:
+    np = chromaprint = None
+
+# Optional: numba compiles the sliding bit-error kernel into one native loop.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 # Initialize MusicBrainz (Add this right under your imports)
 musicbrainzngs.set_useragent(
     "MusicLibraryManager",
@@ -37,6 +54,122 @@ def _fingerprint_worker(path, queue):
         queue.put({"error": str(e)})
 
 
+# --- FINGERPRINT STORAGE ---
+def _pack_fingerprint(fingerprint):
+    """Compresses a fingerprint for storage. Deterministic, so packed values compare equal."""
+    if isinstance(fingerprint, str):
+        fingerprint = fingerprint.encode()
+    return zlib.compress(fingerprint, 9)
+
+
+def _unpack_fingerprint(blob):
+    """
+    Inverse of _pack_fingerprint; always returns bytes. Rows written raw, by an
+    older database or by another script sharing it, are returned unchanged.
+    """
+    if isinstance(blob, str):
+        return blob.encode()
+    try:
+        return zlib.decompress(blob)
+    except zlib.error:
+        return blob
+
+
+def _get_blocks(fingerprint, q, max_blocks):
+    """
+    Returns a bounded, shift-tolerant sample of the fingerprint's q-grams.
+
+    Every overlapping q-gram is hashed to a 32-bit int and only the
+    max_blocks smallest hashes are kept (a bottom-k sketch). Two fingerprints
+    sharing most of their content share most of their sampled blocks, even
+    when one of them is offset by a few characters.
+    """
+    if not fingerprint:
+        return []
+    if isinstance(fingerprint, str):
+        fingerprint = fingerprint.encode()
+
+    crc32 = zlib.crc32
+    grams = {crc32(fingerprint[i : i + q]) for i in range(len(fingerprint) - q + 1)}
+    return heapq.nsmallest(max_blocks, grams)
+
+
+def _frame_buckets(frames, step, bits):
+    """Distinct top-`bits` prefixes of every `step`-th sub-fingerprint."""
+    return np.unique(frames[::step] >> (32 - bits)).tolist()
+
+
+@lru_cache(maxsize=4096)
+def _decode_fingerprint(fingerprint):
+    """
+    Raw 32-bit sub-fingerprints as a read-only uint32 array, or None if unavailable.
+    Cached, so library files that keep turning up as candidates are decoded once.
+    """
+    if chromaprint is None:
+        return None
+    try:
+        raw, _ = chromaprint.decode_fingerprint(fingerprint)
+    except chromaprint.FingerprintError:
+        return None
+    frames = np.array(raw, dtype=np.uint32)
+    frames.flags.writeable = False
+    return frames
+
+
+def _count_bit_errors(diff):
+    """Total set bits in a uint32 array. XOR + popcount vectorizes in numpy."""
+    if hasattr(np, "bitwise_count"):  # numpy >= 2.0
+        return int(np.bitwise_count(diff).sum())
+    return int(np.unpackbits(diff.view(np.uint8)).sum())
+
+
+def _bit_similarity_loop(a, b, max_offset):
+    """_bit_similarity as scalar loops with a SWAR popcount, for numba to compile."""
+    longest = max(len(a), len(b))
+    best = 0.0
+    for offset in range(-max_offset, max_offset + 1):
+        i = offset if offset > 0 else 0
+        j = -offset if offset < 0 else 0
+        n = min(len(a) - i, len(b) - j)
+        if n <= 0:
+            continue
+        errors = 0
+        for k in range(n):
+            v = int(a[i + k]) ^ int(b[j + k])
+            v -= (v >> 1) & 0x55555555
+            v = (v & 0x33333333) + ((v >> 2) & 0x33333333)
+            errors += (((v + (v >> 4)) & 0x0F0F0F0F) * 0x01010101 & 0xFFFFFFFF) >> 24
+        score = (1.0 - errors / (32.0 * n)) * n / longest
+        if score > best:
+            best = score
+    return best
+
+
+_bit_similarity_jit = njit(cache=True)(_bit_similarity_loop) if njit else None
+
+
+def _bit_similarity(a, b, max_offset=0):
+    """
+    1 - bit error rate between two sub-fingerprint arrays, scaled by how much of
+    the longer one the overlap covers. The arrays are slid against each other by
+    up to max_offset frames and the best alignment wins, so rips with a little
+    extra leading silence still line up.
+    """
+    if _bit_similarity_jit is not None:
+        # Fuses XOR and popcount without a temporary array per offset
+        return _bit_similarity_jit(a, b, max_offset)
+    longest = max(len(a), len(b))
+    best = 0.0
+    for offset in range(-max_offset, max_offset + 1):
+        x, y = (a[offset:], b) if offset >= 0 else (a, b[-offset:])
+        n = min(len(x), len(y))
+        if not n:
+            continue
+        errors = _count_bit_errors(x[:n] ^ y[:n])
+        best = max(best, (1.0 - errors / (32.0 * n)) * n / longest)
+    return best
+
+
 # -----------------------------------------------
 
 
@@ -76,10 +209,16 @@ class MusicLibraryManager:
         self.player_process = None
 
         # Tuning for fuzzy matching
-        self.BLOCK_SIZE = 16
+        self.QGRAM_SIZE = 8
+        self.MAX_BLOCKS = 64
+        self.BUCKET_BITS = 20  # top bits of a sub-fingerprint used as its bucket
+        self.BUCKET_STEP = 8  # every Nth stored sub-fingerprint is indexed
+        self.MIN_SHARED_BLOCKS = 3
+        self.MAX_CANDIDATES = 32
         self.SIMILARITY_AUTO = 0.98
         self.SIMILARITY_STICKY = 0.95
         self.SIMILARITY_ASK = 0.85
+        self.MAX_ALIGN_OFFSET = 24  # sub-fingerprint frames (~3s) tried either way
         self.API_SLEEP = 0.4
 
         # State tracking for sticky album selection
@@ -91,7 +230,7 @@ class MusicLibraryManager:
             format="%(asctime)s - %(levelname)s - %(message)s",
         )
 
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = sqlite3.connect(self.db_path, cached_statements=512)
         self.cur = self.conn.cursor()
         self._setup_database()
 
@@ -126,7 +265,7 @@ class MusicLibraryManager:
         self.cur.execute(
             """CREATE TABLE IF NOT EXISTS files (
                             path TEXT PRIMARY KEY,
-                            fingerprint TEXT,
+                            fingerprint BLOB,
                             acoustid_id TEXT, 
                             title TEXT,
                             track_no INTEGER,
@@ -143,6 +282,9 @@ class MusicLibraryManager:
         self.cur.execute(
             "CREATE INDEX IF NOT EXISTS idx_acoustid ON files(acoustid_id)"
         )
+        self.cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_files_fp ON files(fingerprint)"
+        )
 
         # --- Safe migration for existing databases ---
         try:
@@ -165,35 +307,75 @@ class MusicLibraryManager:
         # Fingerprint History
         self.cur.execute(
             """CREATE TABLE IF NOT EXISTS known_fingerprints (
-                            fingerprint TEXT,
+                            fingerprint BLOB,
                             acoustid_id TEXT,
                             PRIMARY KEY (fingerprint, acoustid_id)
                         )"""
         )
+        self.cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_known_fp_id ON known_fingerprints(acoustid_id)"
+        )
+
+        # --- Block tables ---
+        # This script's block keys (integer buckets or q-gram hashes) differ from
+        # the text blocks the other scripts keep in fingerprint_index/known_blocks,
+        # so they live in tables of their own and the shared ones are left alone.
+        self.cur.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'file_blocks'"
+        )
+        rebuild_blocks = self.cur.fetchone() is None
+
+        # --- Migration: block keys depend on whether Chromaprint can decode ---
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS index_meta (
+                            key TEXT PRIMARY KEY,
+                            value TEXT
+                        )"""
+        )
+        scheme = self._block_scheme()
+        self.cur.execute("SELECT value FROM index_meta WHERE key = 'block_scheme'")
+        if not rebuild_blocks and self.cur.fetchone() != (scheme,):
+            self.cur.execute("DROP TABLE IF EXISTS file_blocks")
+            self.cur.execute("DROP TABLE IF EXISTS recording_blocks")
+            rebuild_blocks = True
+        self.cur.execute(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES ('block_scheme', ?)",
+            (scheme,),
+        )
 
-        # Fingerprint Blocks
+        # Fingerprint Blocks (AcoustID based - for local identification)
         self.cur.execute(
-            """CREATE TABLE IF NOT EXISTS known_blocks (
-                            block TEXT,
+            """CREATE TABLE IF NOT EXISTS recording_blocks (
+                            block INTEGER,
                             acoustid_id TEXT
                         )"""
         )
         self.cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_known_blocks ON known_blocks(block)"
+            "CREATE INDEX IF NOT EXISTS idx_recording_blocks ON recording_blocks(block)"
         )
 
         # Fingerprint Index (File Path based - for local dedup)
         self.cur.execute(
-            """CREATE TABLE IF NOT EXISTS fingerprint_index (
-                            block TEXT,
+            """CREATE TABLE IF NOT EXISTS file_blocks (
+                            block INTEGER,
                             path TEXT,
                             FOREIGN KEY(path) REFERENCES files(path) ON DELETE CASCADE
                         )"""
         )
         self.cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_file_blocks ON fingerprint_index(block)"
+            "CREATE INDEX IF NOT EXISTS idx_file_blocks_block ON file_blocks(block)"
         )
 
+        # --- Migration: fingerprints are stored zlib-compressed (user_version 1) ---
+        # Runs before any block rebuild, which reads fingerprints in packed form
+        self.cur.execute("PRAGMA user_version")
+        if self.cur.fetchone()[0] < 1:
+            self._compress_stored_fingerprints()
+            self.cur.execute("PRAGMA user_version = 1")
+
+        if rebuild_blocks:
+            self._rebuild_block_indexes()
+
         # Purge old file_hashes data and repurpose for Audio Hash Tracking
         self.cur.execute("DROP TABLE IF EXISTS file_hashes")
         self.cur.execute(
@@ -222,7 +404,7 @@ class MusicLibraryManager:
                 if not os.path.exists(path_str):
                     self.conn.execute("DELETE FROM files WHERE path = ?", (path_str,))
                     self.conn.execute(
-                        "DELETE FROM fingerprint_index WHERE path = ?", (path_str,)
+                        "DELETE FROM file_blocks WHERE path = ?", (path_str,)
                     )
                     self.conn.execute(
                         "DELETE FROM audio_hashes WHERE path = ?", (path_str,)
@@ -308,29 +490,111 @@ class MusicLibraryManager:
             print("All known files already have audio hashes.")
 
     # --- FINGERPRINT ENGINE ---
-    def _get_blocks(self, fingerprint):
-        """Splits fingerprint into chunks for indexing."""
-        return [
-            fingerprint[i : i + self.BLOCK_SIZE]
-            for i in range(0, len(fingerprint), self.BLOCK_SIZE)
-        ][:16]
+    def _can_reach_threshold(self, fingerprint, candidate):
+        """
+        Length filter: skips pairs whose similarity cannot reach SIMILARITY_ASK.
+        _bit_similarity never exceeds min/max of the decoded frame counts; the
+        encoded text is compressed, so its length only bounds the edit-distance
+        ratio (2 * min(len) / (len_a + len_b)) used without Chromaprint.
+        """
+        query = _decode_fingerprint(fingerprint)
+        if query is not None:
+            decoded = _decode_fingerprint(candidate)
+            if decoded is None:
+                return False
+            longest = max(len(query), len(decoded))
+            return longest and min(len(query), len(decoded)) / longest >= (
+                self.SIMILARITY_ASK
+            )
+        total = len(fingerprint) + len(candidate)
+        return total and 2 * min(len(fingerprint), len(candidate)) / total >= (
+            self.SIMILARITY_ASK
+        )
+
+    def _block_scheme(self):
+        """Names the block key scheme in use, so a change forces an index rebuild."""
+        if chromaprint is None:
+            return f"qgram:{self.QGRAM_SIZE}:{self.MAX_BLOCKS}"
+        return f"bucket:{self.BUCKET_BITS}:{self.BUCKET_STEP}"
+
+    def _fingerprint_blocks(self, fingerprint, query=False):
+        """
+        Index keys for a fingerprint. With Chromaprint these are the top BUCKET_BITS
+        bits of its sub-fingerprints: stored fingerprints index every BUCKET_STEP-th
+        frame and queries probe every frame, so the sampled frames are found at any
+        alignment. Without it, a q-gram sketch of the encoded text is used instead.
+        """
+        if isinstance(fingerprint, str):
+            fingerprint = fingerprint.encode()
+        frames = _decode_fingerprint(fingerprint)
+        if frames is None:
+            return _get_blocks(fingerprint, self.QGRAM_SIZE, self.MAX_BLOCKS)
+        step = 1 if query else self.BUCKET_STEP
+        return _frame_buckets(frames, step, self.BUCKET_BITS)
+
+    def _compress_stored_fingerprints(self):
+        """Rewrites plain fingerprints from older databases in packed form."""
+        self.cur.execute(
+            "SELECT path, fingerprint FROM files WHERE fingerprint IS NOT NULL"
+        )
+        self.cur.executemany(
+            "UPDATE files SET fingerprint = ? WHERE path = ?",
+            [(_pack_fingerprint(fp), path) for path, fp in self.cur.fetchall()],
+        )
+        self.cur.execute("SELECT fingerprint, acoustid_id FROM known_fingerprints")
+        rows = self.cur.fetchall()
+        self.cur.execute("DELETE FROM known_fingerprints")
+        self.cur.executemany(
+            "INSERT OR IGNORE INTO known_fingerprints (fingerprint, acoustid_id) VALUES (?, ?)",
+            [(_pack_fingerprint(fp), acoustid_id) for fp, acoustid_id in rows],
+        )
+
+    def _rebuild_block_indexes(self):
+        """Re-derives both block tables from stored fingerprints after a schema change."""
+        print("Rebuilding fingerprint block indexes...")
+        self.cur.execute(
+            "SELECT path, fingerprint FROM files WHERE fingerprint IS NOT NULL"
+        )
+        for path, fingerprint in self.cur.fetchall():
+            self.cur.executemany(
+                "INSERT INTO file_blocks (block, path) VALUES (?, ?)",
+                [
+                    (b, path)
+                    for b in self._fingerprint_blocks(_unpack_fingerprint(fingerprint))
+                ],
+            )
+
+        self.cur.execute(
+            "SELECT acoustid_id, MIN(fingerprint) FROM known_fingerprints GROUP BY acoustid_id"
+        )
+        for acoustid_id, fingerprint in self.cur.fetchall():
+            self.cur.executemany(
+                "INSERT INTO recording_blocks (block, acoustid_id) VALUES (?, ?)",
+                [
+                    (b, acoustid_id)
+                    for b in self._fingerprint_blocks(_unpack_fingerprint(fingerprint))
+                ],
+            )
 
     def _update_fingerprint_cache(self, acoustid_id, fingerprint):
         """Saves the Fingerprint->ID association to history."""
         try:
             self.cur.execute(
                 "INSERT OR IGNORE INTO known_fingerprints (fingerprint, acoustid_id) VALUES (?, ?)",
-                (fingerprint, acoustid_id),
+                (_pack_fingerprint(fingerprint), acoustid_id),
             )
 
             self.cur.execute(
-                "SELECT 1 FROM known_blocks WHERE acoustid_id = ? LIMIT 1",
+                "SELECT 1 FROM recording_blocks WHERE acoustid_id = ? LIMIT 1",
                 (acoustid_id,),
             )
             if not self.cur.fetchone():
-                blocks = [(b, acoustid_id) for b in self._get_blocks(fingerprint)]
+                blocks = [
+                    (b, acoustid_id)
+                    for b in self._fingerprint_blocks(fingerprint)
+                ]
                 self.cur.executemany(
-                    "INSERT INTO known_blocks (block, acoustid_id) VALUES (?, ?)",
+                    "INSERT INTO recording_blocks (block, acoustid_id) VALUES (?, ?)",
                     blocks,
                 )
             self.conn.commit()
@@ -339,10 +603,13 @@ class MusicLibraryManager:
 
     def _update_index(self, path, fingerprint):
         """Updates the blocking index for a new file."""
-        self.cur.execute("DELETE FROM fingerprint_index WHERE path = ?", (path,))
-        blocks = [(b, path) for b in self._get_blocks(fingerprint)]
+        self.cur.execute("DELETE FROM file_blocks WHERE path = ?", (path,))
+        blocks = [
+            (b, path)
+            for b in self._fingerprint_blocks(fingerprint)
+        ]
         self.cur.executemany(
-            "INSERT INTO fingerprint_index (block, path) VALUES (?, ?)", blocks
+            "INSERT INTO file_blocks (block, path) VALUES (?, ?)", blocks
         )
 
     def _display_local_matches(self, acoustid_id):
@@ -374,72 +641,158 @@ class MusicLibraryManager:
             logging.error(f"Failed to fetch local matches: {e}")
             return set()
 
+    def _best_match(self, fingerprint, candidates):
+        """
+        Returns (similarity, index) of the closest candidate fingerprint at or above
+        SIMILARITY_ASK, or None. Compares decoded sub-fingerprints bit by bit when
+        Chromaprint is available, else uses edit-distance ratio on the text form.
+        """
+        threshold = self.SIMILARITY_ASK
+        max_offset = self.MAX_ALIGN_OFFSET
+        query = _decode_fingerprint(fingerprint)
+        if query is not None:
+            best = None
+            for idx, cand in enumerate(candidates):
+                decoded = _decode_fingerprint(cand)
+                if decoded is None:
+                    continue
+                score = _bit_similarity(query, decoded, max_offset)
+                if score >= threshold and (best is None or score > best[0]):
+                    best = (score, idx)
+            return best
+
+        # Score every candidate in one call to the native RapidFuzz kernel
+        best = process.extractOne(
+            fingerprint,
+            candidates,
+            scorer=fuzz.ratio,
+            score_cutoff=threshold * 100,
+        )
+        if not best:
+            return None
+        _, score, idx = best
+        return score / 100.0, idx
+
     def _find_local_fuzzy_match(self, fingerprint):
-        blocks = self._get_blocks(fingerprint)
-        if not blocks:
+        if not fingerprint:
             return None, 0.0, None
+        if isinstance(fingerprint, str):
+            fingerprint = fingerprint.encode()
 
-        placeholders = ",".join(["?"] * len(blocks))
-        query = f"SELECT DISTINCT path FROM fingerprint_index WHERE block IN ({placeholders})"
-        self.cur.execute(query, blocks)
-        candidates = [row[0] for row in self.cur.fetchall()]
+        # Fast path: a re-scanned file has a byte-identical fingerprint
+        self.cur.execute(
+            """SELECT path, quality_score, format, file_size FROM files
+               WHERE fingerprint = ? AND processed = 1 LIMIT 1""",
+            (_pack_fingerprint(fingerprint),),
+        )
+        if exact := self.cur.fetchone():
+            cand_path, cand_q, cand_fmt, cand_size = exact
+            return (
+                cand_path,
+                1.0,
+                {"score": cand_q or 0.0, "format": cand_fmt, "size": cand_size},
+            )
 
-        best_path = None
-        best_score = 0.0
-        best_record = None
+        blocks = self._fingerprint_blocks(fingerprint, query=True)
+        if not blocks:
+            return None, 0.0, None
 
-        for cand_path in candidates:
-            self.cur.execute(
-                "SELECT fingerprint, quality_score, format, file_size FROM files WHERE path = ?",
-                (cand_path,),
-            )
-            res = self.cur.fetchone()
-            if not res:
-                continue
+        # One round trip: only files sharing enough sampled blocks survive, best
+        # overlap first, and their rows come back with the block lookup. Blocks are
+        # bound as one JSON array so the statement text (and its cached plan) is fixed.
+        query = """
+            SELECT f.path, f.fingerprint, f.quality_score, f.format, f.file_size
+            FROM (
+                SELECT path, COUNT(*) AS shared
+                FROM file_blocks
+                WHERE block IN (SELECT value FROM json_each(?))
+                GROUP BY path
+                HAVING shared >= ?
+                ORDER BY shared DESC
+                LIMIT ?
+            ) c
+            JOIN files f ON f.path = c.path
+            WHERE f.processed = 1 AND f.fingerprint IS NOT NULL
+        """
+        self.cur.execute(
+            query, (json.dumps(blocks), self.MIN_SHARED_BLOCKS, self.MAX_CANDIDATES)
+        )
+        # Only the candidates that survived blocking are decompressed
+        rows = [
+            (row[0], _unpack_fingerprint(row[1]), *row[2:])
+            for row in self.cur.fetchall()
+        ]
+        rows = [row for row in rows if self._can_reach_threshold(fingerprint, row[1])]
 
-            cand_fp, cand_q, cand_fmt, cand_size = res
-            if cand_q is None:
-                cand_q = 0.0
+        if not rows:
+            return None, 0.0, None
 
-            ratio = difflib.SequenceMatcher(None, fingerprint, cand_fp).ratio()
+        best = self._best_match(fingerprint, [row[1] for row in rows])
+        if not best:
+            return None, 0.0, None
 
-            if ratio > best_score:
-                best_score = ratio
-                best_path = cand_path
-                best_record = {"score": cand_q, "format": cand_fmt, "size": cand_size}
+        score, idx = best
+        cand_path, _, cand_q, cand_fmt, cand_size = rows[idx]
+        if cand_q is None:
+            cand_q = 0.0
 
-        return best_path, best_score, best_record
+        return (
+            cand_path,
+            score,
+            {"score": cand_q, "format": cand_fmt, "size": cand_size},
+        )
 
     def _identify_locally(self, fingerprint):
-        blocks = self._get_blocks(fingerprint)
-        if not blocks:
+        if not fingerprint:
             return None, 0.0
+        if isinstance(fingerprint, str):
+            fingerprint = fingerprint.encode()
 
-        placeholders = ",".join(["?"] * len(blocks))
-        query = f"SELECT DISTINCT acoustid_id FROM known_blocks WHERE block IN ({placeholders})"
-        self.cur.execute(query, blocks)
-        candidate_ids = [row[0] for row in self.cur.fetchall()]
+        # Fast path: exact hit on the (fingerprint, acoustid_id) primary key
+        self.cur.execute(
+            "SELECT acoustid_id FROM known_fingerprints WHERE fingerprint = ? LIMIT 1",
+            (_pack_fingerprint(fingerprint),),
+        )
+        if exact := self.cur.fetchone():
+            return exact[0], 1.0
 
-        if not candidate_ids:
+        blocks = self._fingerprint_blocks(fingerprint, query=True)
+        if not blocks:
             return None, 0.0
 
-        best_id = None
-        best_score = 0.0
+        query = """
+            SELECT k.acoustid_id, k.fingerprint
+            FROM (
+                SELECT acoustid_id, COUNT(*) AS shared
+                FROM recording_blocks
+                WHERE block IN (SELECT value FROM json_each(?))
+                GROUP BY acoustid_id
+                HAVING shared >= ?
+                ORDER BY shared DESC
+                LIMIT ?
+            ) c
+            JOIN known_fingerprints k ON k.acoustid_id = c.acoustid_id
+        """
+        self.cur.execute(
+            query, (json.dumps(blocks), self.MIN_SHARED_BLOCKS, self.MAX_CANDIDATES)
+        )
+        history = [
+            (acoustid_id, _unpack_fingerprint(hist_fp))
+            for acoustid_id, hist_fp in self.cur.fetchall()
+        ]
+        history = [
+            row for row in history if self._can_reach_threshold(fingerprint, row[1])
+        ]
 
-        for cid in candidate_ids:
-            self.cur.execute(
-                "SELECT fingerprint FROM known_fingerprints WHERE acoustid_id = ?",
-                (cid,),
-            )
-            history_fps = self.cur.fetchall()
+        if not history:
+            return None, 0.0
 
-            for (hist_fp,) in history_fps:
-                ratio = difflib.SequenceMatcher(None, fingerprint, hist_fp).ratio()
-                if ratio > best_score:
-                    best_score = ratio
-                    best_id = cid
+        best = self._best_match(fingerprint, [hist_fp for _, hist_fp in history])
+        if not best:
+            return None, 0.0
 
-        return best_id, best_score
+        score, idx = best
+        return history[idx][0], score
 
     def _calculate_quality(self, file_path):
         """Generates a quality score based heavily on format, then bit depth and size."""
@@ -582,7 +935,7 @@ class MusicLibraryManager:
             except sqlite3.Error as e:
                 logging.error(f"Error closing database: {e}")
 
-def _fallback_musicbrainz_search(self, file_path):
+    def _fallback_musicbrainz_search(self, file_path):
         """Attempts a text-based search on MusicBrainz using existing file metadata."""
         try:
             # Try to grab whatever tags currently exist on the file
@@ -971,24 +1324,20 @@ def _fallback_musicbrainz_search(self, file_path):
         # ==========================================
         audio_hash = self._get_audio_hash(path)
         if audio_hash:
+            # One round trip: the hash owner, its score and the winner decision
             self.cur.execute(
-                "SELECT path FROM audio_hashes WHERE audio_hash = ?", (audio_hash,)
+                """SELECT h.path,
+                          COALESCE(f.quality_score, 0.0),
+                          ? > COALESCE(f.quality_score, 0.0)
+                   FROM audio_hashes h
+                   LEFT JOIN files f ON f.path = h.path
+                   WHERE h.audio_hash = ?""",
+                (quality["score"], audio_hash),
             )
             if dup_row := self.cur.fetchone():
-                existing_path = dup_row[0]
+                existing_path, existing_score, is_upgrade = dup_row
 
-                # We have a match. Compare qualities.
-                self.cur.execute(
-                    "SELECT quality_score FROM files WHERE path = ?", (existing_path,)
-                )
-                existing_score_row = self.cur.fetchone()
-                existing_score = (
-                    existing_score_row[0]
-                    if existing_score_row and existing_score_row[0] is not None
-                    else 0.0
-                )
-
-                if quality["score"] > existing_score:
+                if is_upgrade:
                     print(
                         f" -> Exact audio match found! Upgrading quality ({existing_score} -> {quality['score']})"
                     )
@@ -996,14 +1345,14 @@ def _fallback_musicbrainz_search(self, file_path):
                         self._safe_move(
                             existing_path, self.dup_folder, operation="move"
                         )
-                        self.cur.execute(
-                            "DELETE FROM files WHERE path = ?", (existing_path,)
-                        )
-                        self.cur.execute(
-                            "UPDATE audio_hashes SET path = ? WHERE audio_hash = ?",
-                            (path, audio_hash),
-                        )
-                        self.conn.commit()
+                        with self.conn:
+                            self.cur.execute(
+                                "DELETE FROM files WHERE path = ?", (existing_path,)
+                            )
+                            self.cur.execute(
+                                "UPDATE audio_hashes SET path = ? WHERE audio_hash = ?",
+                                (path, audio_hash),
+                            )
                     # Do not return here. Let the new file continue down so it gets fingerprinted and tagged.
                 else:
                     print(
@@ -1116,11 +1465,13 @@ def _fallback_musicbrainz_search(self, file_path):
                 # Fallback to Sticky Matching / Strict API Auto-Select / Manual Prompt
                 sticky_match = None
 
-                if self.last_selected_album_id:
+                sticky_id = self.last_selected_album_id
+                if sticky_id:
+                    sticky_min = self.SIMILARITY_STICKY
                     for c in candidates:
                         if (
-                            c["release"]["id"] == self.last_selected_album_id
-                            and c["similarity"] >= self.SIMILARITY_STICKY
+                            c["release"]["id"] == sticky_id
+                            and c["similarity"] >= sticky_min
                         ):
                             sticky_match = c
                             break
@@ -1290,7 +1641,7 @@ def _fallback_musicbrainz_search(self, file_path):
                VALUES (?,?,?,?,?,?,?,?,?,?,?, CURRENT_TIMESTAMP)""",
             (
                 final_path,
-                fingerprint,
+                _pack_fingerprint(fingerprint),
                 current_acoustid_id,
                 meta["title"],
                 meta["track_no"],
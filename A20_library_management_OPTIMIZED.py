@@ -6,31 +6,366 @@ import subprocess
 import sqlite3
 import logging
 import shutil
-#import difflib
-import traceback
+import errno
+import re
+import functools
+from urllib.parse import urlencode
+from email.utils import parsedate_to_datetime
 import json
 import hashlib
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock, Semaphore
-from queue import Queue, PriorityQueue
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from threading import Semaphore
+from queue import Queue, Empty
 import multiprocessing
 
 import acoustid
 import mutagen
+import requests
+from urllib3.util.retry import Retry
 import musicbrainzngs
-from mutagen.id3 import ID3, TPE1, TPE2, TRCK, TPOS, TIT2, TALB
+from mutagen.id3 import ID3, ID3NoHeaderError, TPE1, TPE2, TRCK, TPOS, TIT2, TALB
+from mutagen.mp3 import EasyMP3
+from mutagen.flac import FLAC
+from mutagen.easymp4 import EasyMP4
+from mutagen.wave import WAVE
+from mutagen.asf import ASF
+
+# Optional: orjson parses and serializes the cached payloads several times faster
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Global shutdown event used to gracefully stop long-running operations on Ctrl+C
 shutdown_event = threading.Event()
 
+# AcoustID error codes that mean "slow down": service unavailable, too many requests
+_ACOUSTID_BACKOFF_CODES = frozenset({13, 14})
+# HTTP statuses treated the same way when the body is not an AcoustID error
+_ACOUSTID_BACKOFF_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Audio formats the library manager will pick up (lowercase, with the dot)
+VALID_EXTS = frozenset({".mp3", ".flac", ".m4a", ".mp4", ".wma", ".wav"})
+
+# Header readers by extension, with the same tag interface mutagen.File(easy=True)
+# would pick, so the quality scan skips mutagen's probe of every format
+_TAG_READERS = {
+    ".mp3": EasyMP3,
+    ".flac": FLAC,
+    ".m4a": EasyMP4,
+    ".mp4": EasyMP4,
+    ".wav": WAVE,
+    ".wma": ASF,
+}
+
+# UTF-8 ID3 text frame factory for each meta field written to MP3s; the constant
+# encoding is bound once here instead of passed on every call
+_ID3_FRAMES = tuple(
+    (functools.partial(frame, encoding=3), key)
+    for frame, key in (
+        (TIT2, "title"),
+        (TALB, "album"),
+        (TPE1, "artist"),
+        (TPE2, "album_artist"),
+        (TRCK, "track_no"),
+        (TPOS, "disc_no"),
+    )
+)
+
 # Initialize MusicBrainz API wrapper
 musicbrainzngs.set_useragent(
     "MusicLibraryManager", "1.0", "https://github.com/MusicLibraryManager"
 )
 
 
+# Only failed connects are retried at the transport level; those never reached
+# AcoustID. Throttling and 5xx answers are retried by _call_acoustid, so the
+# AIMD rate controller sees every one of them.
+_ACOUSTID_RETRY = Retry(total=3, connect=3, read=0, status=0, backoff_factor=0.3)
+
+
+def _retry_after(response):
+    """Seconds a Retry-After header asks us to wait, or None if absent or unreadable."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AcoustIDError(Exception):
+    """An AcoustID request that failed at the transport or response level."""
+
+
+# Lookups are POSTed as a form body and answered gzip-compressed
+_ACOUSTID_HEADERS = {
+    "Accept-Encoding": "gzip",
+    "Content-Type": "application/x-www-form-urlencoded",
+}
+# (connect, read) seconds; a stalled connection must not pin an API worker forever
+_ACOUSTID_TIMEOUT = (5, 30)
+
+
+class _PooledAcoustIDAdapter(acoustid.CompressedHTTPAdapter):
+    """pyacoustid's gzip-body adapter with a small keep-alive pool and retries."""
+
+    def __init__(self):
+        super().__init__(
+            pool_connections=1,
+            pool_maxsize=16,
+            max_retries=_ACOUSTID_RETRY,
+        )
+
+
+# OPTIMIZATION: pyacoustid opens a fresh Session (TCP + TLS handshake) for every
+# request. Lookups go through this one shared Session instead, which keeps the
+# connection to api.acoustid.org alive; pacing is done by the manager.
+_ACOUSTID_SESSION = requests.Session()
+_ACOUSTID_SESSION.mount("http://", _PooledAcoustIDAdapter())
+_ACOUSTID_SESSION.mount("https://", _PooledAcoustIDAdapter())
+
+# Handlers are configured in MusicLibraryManager.__init__; the format records the
+# calling function, and logger.exception attaches the traceback to the log.
+logger = logging.getLogger(__name__)
+
+
+def _scan_files(folder, skip_dirs=()):
+    """
+    Yields a DirEntry for every non-directory under folder, without descending
+    into any directory listed in skip_dirs.
+
+    OPTIMIZATION: os.scandir hands back the file type with each entry, so the
+    walk costs one syscall per directory and no per-file stat. Unreadable
+    directories are skipped, as os.walk does.
+
+    OPTIMIZATION: Each directory's files come out in inode order, which roughly
+    follows on-disk layout, so the readers behind the walk seek less on spinning
+    disks. entry.inode() comes from readdir and costs no extra syscall.
+    """
+    stack = [folder]
+    while stack:
+        files = []
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.path not in skip_dirs:
+                            stack.append(entry.path)
+                    else:
+                        files.append(entry)
+        except OSError:
+            continue
+        files.sort(key=lambda entry: entry.inode())
+        yield from files
+
+
+# Fingerprint ints per known_blocks/fingerprint_index block key
+_BLOCK_SIZE = 16
+
+# Path separators become hyphens; anything else that is not a word character,
+# space, hyphen or dot is dropped from names
+_SEPARATORS_TO_DASH = str.maketrans({"/": "-", "\\": "-"})
+_UNSAFE_NAME_RE = re.compile(r"[^\w \-.]")
+
+
+@functools.lru_cache(maxsize=4096)
+def _sanitize(name):
+    """
+    Filesystem-safe version of a tag value.
+
+    OPTIMIZATION: Artist and album names repeat on every track of a release,
+    so results are memoized and the character filter is one precompiled regex.
+    """
+    cleaned = name.translate(_SEPARATORS_TO_DASH)
+    return _UNSAFE_NAME_RE.sub("", cleaned).strip()
+
+
+if orjson is not None:
+    _json_loads = orjson.loads
+
+    def _json_dumps(obj):
+        return orjson.dumps(obj).decode()
+
+else:
+    _json_loads, _json_dumps = json.loads, json.dumps
+
+
+def _pick(obj, keys):
+    """Shallow copy of obj restricted to keys it actually has."""
+    return {key: obj[key] for key in keys if key in obj}
+
+
+def _slim_artists(obj):
+    """First credited artist's name only; the only artist field read downstream."""
+    return [_pick(artist, ("name",)) for artist in obj["artists"][:1]]
+
+
+def _slim_lookup(resp):
+    """
+    Projects an AcoustID lookup response onto the fields candidate building and
+    tagging read. Releases carry large artist, medium and track trees that were
+    parsed, cached and re-parsed on every cache hit only to be thrown away.
+    """
+    if resp.get("status") != "ok":
+        return resp
+    results = []
+    for result in resp.get("results", []):
+        slim_result = _pick(result, ("id", "score"))
+        if "recordings" in result:
+            slim_result["recordings"] = recordings = []
+            for recording in result["recordings"]:
+                slim_rec = _pick(recording, ("id", "title"))
+                if "artists" in recording:
+                    slim_rec["artists"] = _slim_artists(recording)
+                if "releases" in recording:
+                    slim_rec["releases"] = [
+                        _slim_release(release, recording)
+                        for release in recording["releases"]
+                    ]
+                recordings.append(slim_rec)
+        results.append(slim_result)
+    return {"status": "ok", "results": results}
+
+
+def _slim_release(release, recording):
+    """
+    Release fields used for candidates and album rows. The medium/track tree is
+    reduced to this recording's track and disc number, resolved once here.
+    """
+    slim = _pick(release, ("id", "title", "country"))
+    if "artists" in release:
+        slim["artists"] = _slim_artists(release)
+    if "date" in release:
+        slim["date"] = _pick(release["date"], ("year",))
+    slim["track_no"], slim["disc_no"], slim["track_match"] = _locate_track(
+        release, recording
+    )
+    return slim
+
+
+def _locate_mb_track(release, rec_id):
+    """
+    (track number, disc position) of a recording in a MusicBrainz release-list
+    entry as tag-ready strings, stopping at the first hit; ("1", "1") if it is
+    not listed.
+    """
+    for medium in release.get("medium-list", []):
+        for track in medium.get("track-list", []):
+            if (track_rec := track.get("recording")) and track_rec.get("id") == rec_id:
+                return str(track.get("number", 1)), str(medium.get("position", 1))
+    return "1", "1"
+
+
+def _first_artist_name(obj):
+    """Name of obj's first credited artist, or None; no throwaway [{}] defaults."""
+    if artists := obj.get("artists"):
+        return artists[0].get("name")
+    return None
+
+
+def _release_year(release, default):
+    """release["date"]["year"] as a string, or default when either is missing."""
+    if (date := release.get("date")) and (year := date.get("year")) is not None:
+        return str(year)
+    return default
+
+
+def _locate_track(release, recording):
+    """
+    (track, disc, matched_by) of the recording within the release, with track and
+    disc as tag-ready strings. Every medium is searched by recording ID before any
+    title match, so a repeated title earlier in the release cannot win. matched_by
+    is "id", "title" or None for ("1", "1").
+    """
+    mediums = release.get("mediums", [])
+    rec_id = str(recording.get("id"))
+    for medium in mediums:
+        for track in medium.get("tracks", []):
+            if (track_rec := track.get("recording")) is not None and str(
+                track_rec.get("id")
+            ) == rec_id:
+                return (
+                    str(track.get("position", 1)),
+                    str(medium.get("position", 1)),
+                    "id",
+                )
+    target_title = str(recording.get("title", "")).lower().strip()
+    for medium in mediums:
+        for track in medium.get("tracks", []):
+            if str(track.get("title", "")).lower().strip() == target_title:
+                return (
+                    str(track.get("position", 1)),
+                    str(medium.get("position", 1)),
+                    "title",
+                )
+    return "1", "1", None
+
+
+def _is_audio_file(name):
+    """O(1) extension check against VALID_EXTS."""
+    return os.path.splitext(name)[1].lower() in VALID_EXTS
+
+
 # --- ISOLATED CPU WORKER (NO MULTIPROCESSING) ---
+_HAS_FADVISE = hasattr(os, "posix_fadvise")
+
+
+def _content_hash(path):
+    """blake2b of the raw file bytes, read in 1 MB chunks."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        # OPTIMIZATION: Ask for aggressive readahead. This read also leaves the
+        # file in the page cache for the ffmpeg/fpcalc pass that follows a miss.
+        if _HAS_FADVISE:
+            fd = f.fileno()
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _ffmpeg_audio_hash(path):
+    """
+    md5 of 30 seconds of decoded PCM starting at 0:15, so re-tagged or re-muxed
+    copies of the same audio hash alike. Returns None if shutdown interrupts it.
+    """
+    hasher = hashlib.md5()
+    cmd = [
+        "ffmpeg",
+        "-threads",
+        "1",
+        "-v",
+        "quiet",
+        "-ss",
+        "00:00:15",
+        "-t",
+        "30",
+        "-i",
+        path,
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        "-",
+    ]
+    with subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    ) as process:
+        for chunk in iter(lambda: process.stdout.read(8192 * 1024), b""):
+            if shutdown_event.is_set():
+                return None
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 def _cpu_bound_worker(path):
     """
     Handles heavy lifting: ffmpeg hashing and acoustid fingerprinting.
@@ -51,37 +386,12 @@ def _cpu_bound_worker(path):
 
     try:
         # 1. Hashing with ffmpeg
-        hasher = hashlib.md5()
-        cmd = [
-            "ffmpeg",
-            "-threads",
-            "1",
-            "-v",
-            "quiet",
-            "-ss",
-            "00:00:15",
-            "-t",
-            "30",
-            "-i",
-            path,
-            "-f",
-            "s16le",
-            "-acodec",
-            "pcm_s16le",
-            "-",
-        ]
         try:
-            with subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
-            ) as process:
-                for chunk in iter(lambda: process.stdout.read(8192 * 1024), b""):
-                    if shutdown_event.is_set():
-                        return result
-                    if chunk:
-                        hasher.update(chunk)
-            result["hash"] = hasher.hexdigest()
+            result["hash"] = _ffmpeg_audio_hash(path)
+            if shutdown_event.is_set():
+                return result
         except Exception as e:
-            logging.warning(f"Hashing failed for {path}: {e}")
+            logger.warning(f"Hashing failed for {path}: {e}")
             result["hash"] = None
 
         # 2. Fingerprinting with acoustid (fresh import in thread)
@@ -91,14 +401,13 @@ def _cpu_bound_worker(path):
             result["duration"] = duration
             result["fingerprint"] = fingerprint
         except Exception as e:
-            logging.warning(f"Fingerprinting failed for {path}: {e}")
+            logger.warning(f"Fingerprinting failed for {path}: {e}")
             result["fingerprint"] = None
             result["duration"] = None
 
     except Exception as e:
         result["error"] = str(e)
-        logging.error(f"Worker error on {path}: {e}")
-        traceback.print_exc()
+        logger.exception(f"Worker error on {path}: {e}")
 
     return result
 
@@ -119,6 +428,14 @@ class MusicLibraryManager:
 
         # Map the JSON keys to class attributes with fallback defaults
         self.api_key = config.get("api_key")
+        # The fields every lookup shares, form-encoded once instead of per request
+        self.lookup_body_prefix = urlencode(
+            {
+                "format": "json",
+                "client": self.api_key or "",
+                "meta": "recordings releases tracks",
+            }
+        )
         self.music_folder = os.path.abspath(config.get("music_folder", ""))
         self.destination_folder = os.path.abspath(
             config.get("destination_folder", "")
@@ -144,39 +461,68 @@ class MusicLibraryManager:
         self.player_process = None
 
         # Tuning for fuzzy matching
-        self.BLOCK_SIZE = 16
         self.SIMILARITY_AUTO = 0.98
         self.SIMILARITY_STICKY = 0.95
-        self.API_SLEEP = 0.4
+        # OPTIMIZATION: AcoustID allows 3 requests/s. _wait_api_slot spaces
+        # lookups 1/api_rate apart across all API threads, so workers no longer
+        # sleep on their own. The rate is adjusted AIMD-style: it creeps back up
+        # on success and halves whenever the service reports it is overloaded or
+        # rate limiting us.
+        self.API_MAX_RATE = 3.0  # requests/s
+        self.API_MIN_RATE = 0.25
+        self.API_RATE_STEP = 0.1
+        self.API_RETRIES = 3
+        self.API_MAX_BACKOFF = 60.0  # cap on any one retry wait, Retry-After included
+        self.api_rate = self.API_MAX_RATE
+        self.next_api_slot = 0.0  # time.monotonic() of the next free request slot
+        # Fingerprints sent per /v2/lookup call when Stage 2 prefetches
+        self.LOOKUP_BATCH_SIZE = 20
+        self.prefetched_lookups = {}  # fingerprint -> lookup response
 
         # OPTIMIZATION: Memory-based caching
         self.owned_ids_cache = {}  # acoustid_id -> set of release_ids
+        self.known_block_ids = set()  # acoustid_ids that already have known_blocks rows
         self.quality_cache = {}  # path -> quality dict
-        self.fingerprint_cache = {}  # path -> fingerprint
         self.audio_hash_cache = {}  # audio_hash -> path
+        self.hash_claims = {}  # audio_hash -> path of the copy in Stage 2 right now
+        self.hash_waiting = {}  # audio_hash -> copies deferred until that one settles
+        self.score_cache = {}  # path -> quality_score of processed files
         self.cache_lock = threading.Lock()
+        # Per-thread read connections for worker lookups (closed when the thread exits)
+        self._thread_local = threading.local()
 
         # Threading/Concurrency Controls
         self.api_lock = threading.Lock()
         self.api_semaphore = Semaphore(1)  # MusicBrainz rate limiting
         self.last_mb_call = 0.0
         self.db_queue = None
+        # Background mover for files leaving the pipeline (duplicates, unresolved)
+        self.io_executor = None
+        self.pending_moves = set()  # queued moves; each future removes itself when done
         self.last_selected_album_id = None
 
         # OPTIMIZATION: Increase worker threads for I/O-bound operations
         cpu_count = multiprocessing.cpu_count()
-        self.cpu_workers = max(4, cpu_count // 2)  # 4-8 workers for audio processing
+        # Stage 1 threads spend their time blocked on ffmpeg/fpcalc subprocesses, which
+        # run outside the GIL, so one thread per core keeps every core decoding
+        # without the SQLite-in-fork problems a process pool caused.
+        self.cpu_workers = max(4, cpu_count)
         self.api_workers = min(8, cpu_count)  # 8-16 workers for API calls (mostly waiting)
         self.db_batch_size = 200  # Batch more DB operations before committing
+        self.db_commit_interval = 2.0  # ...but never hold writes longer than this (seconds)
 
         logging.basicConfig(
             filename="library_manager.log",
             level=logging.INFO,
-            format="%(asctime)s - %(levelname)s - %(message)s",
+            format="%(asctime)s - %(levelname)s - %(funcName)s - %(message)s",
         )
 
         # Main thread connection (only for reads before processing starts)
-        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        # OPTIMIZATION: A larger prepared-statement cache (default 128) keeps every
+        # hot query compiled across the whole run
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, cached_statements=512
+        )
         self.cur = self.conn.cursor()
         self._setup_database()
 
@@ -198,6 +544,7 @@ class MusicLibraryManager:
         # OPTIMIZATION: Increase cache size (negative = KB)
         self.cur.execute("PRAGMA cache_size = -512000")  # 512MB cache
         self.cur.execute("PRAGMA temp_store = MEMORY")  # Use RAM for temp tables
+        self.cur.execute("PRAGMA mmap_size = 268435456")  # 256MB memory-mapped reads
 
         self.cur.execute(
             """CREATE TABLE IF NOT EXISTS albums (
@@ -210,6 +557,7 @@ class MusicLibraryManager:
             path TEXT PRIMARY KEY, fingerprint TEXT, acoustid_id TEXT, title TEXT, track_no INTEGER, 
             disc_no INTEGER, format TEXT, file_size INTEGER, quality_score REAL, album_id TEXT, 
             processed INTEGER DEFAULT 0, date_modified DATETIME DEFAULT CURRENT_TIMESTAMP,
+            duration REAL,
             FOREIGN KEY (album_id) REFERENCES albums (release_id)
         )"""
         )
@@ -217,8 +565,13 @@ class MusicLibraryManager:
         self.cur.execute(
             "CREATE INDEX IF NOT EXISTS idx_acoustid ON files(acoustid_id)"
         )
+        # Partial covering index for the duplicate lookups, the owned-release preload
+        # and the processed-path scan, which only ever look at processed rows. It
+        # replaces the low-selectivity idx_processed the planner used to prefer.
+        self.cur.execute("DROP INDEX IF EXISTS idx_processed")
         self.cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_processed ON files(processed)"
+            """CREATE INDEX IF NOT EXISTS idx_files_active
+            ON files(acoustid_id, album_id, quality_score, path) WHERE processed = 1"""
         )
 
         try:
@@ -227,6 +580,11 @@ class MusicLibraryManager:
             )
         except sqlite3.OperationalError:
             pass
+        # Duration from fpcalc is kept so a re-sync never has to decode the file again
+        try:
+            self.cur.execute("ALTER TABLE files ADD COLUMN duration REAL")
+        except sqlite3.OperationalError:
+            pass
 
         self.cur.execute(
             """CREATE TRIGGER IF NOT EXISTS update_files_modtime
@@ -250,13 +608,32 @@ class MusicLibraryManager:
             "CREATE INDEX IF NOT EXISTS idx_known_blocks ON known_blocks(block)"
         )
 
+        # OPTIMIZATION: WITHOUT ROWID clusters rows on (block, path), so block lookups
+        # are covering and the primary key itself keeps one row per pair
+        fingerprint_index_ddl = """CREATE TABLE IF NOT EXISTS {name} (
+            block TEXT, path TEXT, PRIMARY KEY (block, path),
+            FOREIGN KEY(path) REFERENCES files(path) ON DELETE CASCADE
+        ) WITHOUT ROWID"""
         self.cur.execute(
-            """CREATE TABLE IF NOT EXISTS fingerprint_index (
-            block TEXT, path TEXT, FOREIGN KEY(path) REFERENCES files(path) ON DELETE CASCADE
-        )"""
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'fingerprint_index'"
         )
+        row = self.cur.fetchone()
+        if row and "WITHOUT ROWID" not in row[0].upper():
+            # Migrate the old rowid table; INSERT OR IGNORE drops repeated pairs
+            self.cur.execute(fingerprint_index_ddl.format(name="fingerprint_index_new"))
+            self.cur.execute(
+                "INSERT OR IGNORE INTO fingerprint_index_new (block, path) "
+                "SELECT block, path FROM fingerprint_index"
+            )
+            self.cur.execute("DROP TABLE fingerprint_index")
+            self.cur.execute(
+                "ALTER TABLE fingerprint_index_new RENAME TO fingerprint_index"
+            )
+        else:
+            self.cur.execute(fingerprint_index_ddl.format(name="fingerprint_index"))
+        # Per-file rebuilds and prunes delete by path
         self.cur.execute(
-            "CREATE INDEX IF NOT EXISTS idx_file_blocks ON fingerprint_index(block)"
+            "CREATE INDEX IF NOT EXISTS idx_file_blocks_path ON fingerprint_index(path)"
         )
 
         self.cur.execute("DROP TABLE IF EXISTS file_hashes")
@@ -266,47 +643,123 @@ class MusicLibraryManager:
         )"""
         )
 
+        # Stage 1 results keyed by file identity rather than path, so unchanged
+        # files skip ffmpeg/fpcalc/mutagen even after being moved or renamed.
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS scan_cache (
+            inode INTEGER, size INTEGER, mtime_ns INTEGER, audio_hash TEXT, duration REAL,
+            fingerprint BLOB, quality TEXT, content_hash TEXT, PRIMARY KEY (inode, size, mtime_ns)
+        )"""
+        )
+        # Raw-bytes digest, so byte-identical copies reuse an earlier scan
+        try:
+            self.cur.execute("ALTER TABLE scan_cache ADD COLUMN content_hash TEXT")
+        except sqlite3.OperationalError:
+            pass
+        self.cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_scan_cache_content ON scan_cache(content_hash)"
+        )
+
+        # AcoustID responses by fingerprint: re-runs and repeated rips skip the web service
+        self.cur.execute(
+            """CREATE TABLE IF NOT EXISTS lookup_cache (
+            fingerprint BLOB PRIMARY KEY, payload TEXT, ts REAL
+        )"""
+        )
+        # "No match" answers are not kept: AcoustID may learn the recording later
+        self.cur.execute(
+            "DELETE FROM lookup_cache WHERE json_array_length(payload, '$.results') = 0"
+        )
+
         self.conn.commit()
 
+    def _connect(self):
+        """
+        Opens a secondary connection with the same read-side tuning as the main one.
+        OPTIMIZATION: cache_size/temp_store/mmap_size are per-connection settings
+        """
+        conn = sqlite3.connect(self.db_path, cached_statements=512)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA cache_size = -65536")  # 64MB cache
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA mmap_size = 268435456")
+        return conn
+
+    def _read_conn(self):
+        """Returns this thread's read connection, opening it on first use."""
+        conn = getattr(self._thread_local, "conn", None)
+        if conn is None:
+            conn = self._thread_local.conn = self._connect()
+        return conn
+
     def _preload_cache(self):
         """OPTIMIZATION: Preload database into memory at startup."""
         print("Preloading database cache into memory...")
         try:
             # Use a dedicated read-only connection to avoid interfering with the background writer thread.
-            with sqlite3.connect(self.db_path) as read_conn:
+            with self._connect() as read_conn:
                 read_cur = read_conn.cursor()
 
                 # Load audio hashes
+                # OPTIMIZATION: Iterate cursors directly so rows stream from SQLite
+                # instead of being materialized in an intermediate list first
                 read_cur.execute("SELECT audio_hash, path FROM audio_hashes")
-                for audio_hash, path in read_cur.fetchall():
-                    self.audio_hash_cache[audio_hash] = path
+                self.audio_hash_cache.update(read_cur)
 
                 # Load owned release IDs by acoustid
                 read_cur.execute(
                     "SELECT DISTINCT acoustid_id, album_id FROM files WHERE processed = 1 AND acoustid_id IS NOT NULL"
                 )
-                for acoustid_id, album_id in read_cur.fetchall():
+                for acoustid_id, album_id in read_cur:
                     if acoustid_id not in self.owned_ids_cache:
                         self.owned_ids_cache[acoustid_id] = set()
                     self.owned_ids_cache[acoustid_id].add(album_id)
 
+                # Load quality scores so duplicate checks never hit the database
+                read_cur.execute(
+                    "SELECT path, quality_score FROM files WHERE quality_score IS NOT NULL"
+                )
+                self.score_cache.update(read_cur)
+
+                # AcoustIDs whose fingerprint blocks are already stored
+                read_cur.execute("SELECT DISTINCT acoustid_id FROM known_blocks")
+                self.known_block_ids.update(row[0] for row in read_cur)
+
             print(
-                f"Loaded {len(self.audio_hash_cache)} audio hashes and {len(self.owned_ids_cache)} acoustid entries."
+                f"Loaded {len(self.audio_hash_cache)} audio hashes, {len(self.owned_ids_cache)} acoustid entries "
+                f"and {len(self.score_cache)} quality scores."
             )
         except Exception as e:
-            logging.error(f"Error preloading cache: {e}")
+            logger.error(f"Error preloading cache: {e}")
 
     def _db_writer_thread(self):
         """
         Runs in the background, executing queued DB operations sequentially.
         CRITICAL: This thread owns the cursor and connection - no other thread touches the DB directly.
-        OPTIMIZATION: Batch operations before committing
+        OPTIMIZATION: Batch operations before committing, every db_batch_size
+        operations or db_commit_interval seconds, whichever comes first. The time
+        bound keeps worker read connections from missing recent rows on a slow run.
+
+        Task formats:
+            ("execute", query, params)
+            ("executemany", query, seq_of_params)
+            ("batch", None, [(op_type, query, params), ...])  # applied all-or-nothing
+            ("index", path, [(block, path), ...])  # deferred until the next commit
         """
+        self.pending_index = {}  # path -> fingerprint_index rows awaiting the next commit
         operations_count = 0
+        last_commit = time.monotonic()
         while True:
-            task = self.db_queue.get()
+            try:
+                task = self.db_queue.get(timeout=self.db_commit_interval)
+            except Empty:
+                if operations_count:
+                    self._commit_writes()
+                    operations_count = 0
+                last_commit = time.monotonic()
+                continue
             if task is None:  # Poison pill
-                self.conn.commit()
+                self._commit_writes()
                 break
 
             op_type, query, params = task
@@ -317,43 +770,104 @@ class MusicLibraryManager:
                         self.cur.execute(query, params)
                     elif op_type == "executemany":
                         self.cur.executemany(query, params)
+                    elif op_type == "batch":
+                        self._execute_batch(params)
+                    elif op_type == "index":
+                        self.pending_index[query] = params
 
                     operations_count += 1
                     # OPTIMIZATION: Increased batch size for fewer commits
-                    if operations_count >= self.db_batch_size:
-                        self.conn.commit()
+                    if (
+                        operations_count >= self.db_batch_size
+                        or time.monotonic() - last_commit >= self.db_commit_interval
+                    ):
+                        self._commit_writes()
                         operations_count = 0
+                        last_commit = time.monotonic()
                     break
                 except sqlite3.OperationalError as e:
                     if "locked" in str(e).lower() and attempt < 5:
                         attempt += 1
                         time.sleep(0.1)
                         continue
-                    logging.error(f"Database write failed: {e} | Query: {query}")
-                    traceback.print_exc()
+                    logger.exception(f"Database write failed: {e} | Query: {query}")
                     break
                 except sqlite3.Error as e:
-                    logging.error(f"Database write failed: {e} | Query: {query}")
-                    traceback.print_exc()
+                    logger.exception(f"Database write failed: {e} | Query: {query}")
                     break
             self.db_queue.task_done()
 
+    def _execute_batch(self, ops):
+        """
+        Applies a group of statements atomically inside the writer's open transaction.
+        A savepoint keeps the group all-or-nothing without forcing an early commit.
+        """
+        if not self.conn.in_transaction:
+            self.cur.execute("BEGIN")
+        self.cur.execute("SAVEPOINT batch_op")
+        index_rows = {}
+        try:
+            for op_type, query, params in ops:
+                if op_type == "index":
+                    index_rows[query] = params
+                elif op_type == "executemany":
+                    self.cur.executemany(query, params)
+                else:
+                    self.cur.execute(query, params)
+        except sqlite3.Error:
+            self.cur.execute("ROLLBACK TO batch_op")
+            self.cur.execute("RELEASE batch_op")
+            raise
+        self.cur.execute("RELEASE batch_op")
+        # Index rows only count once the rest of the group has been applied
+        self.pending_index.update(index_rows)
+
+    def _commit_writes(self):
+        """Flushes deferred fingerprint_index rows, then commits the writer's transaction."""
+        if self.pending_index:
+            # A failed flush is rolled back as a whole, so a DELETE can never be
+            # committed without its INSERT; the rows stay pending for the next commit
+            self.cur.execute("SAVEPOINT flush_index")
+            try:
+                self._flush_index()
+            except sqlite3.Error as e:
+                self.cur.execute("ROLLBACK TO flush_index")
+                logger.exception(f"Fingerprint index flush failed: {e}")
+            else:
+                self.pending_index = {}
+            self.cur.execute("RELEASE flush_index")
+        self.conn.commit()
+
+    def _flush_index(self):
+        """
+        OPTIMIZATION: Rebuilds every pending file's fingerprint_index rows with one
+        DELETE and one executemany of a single cached INSERT, instead of a
+        DELETE + INSERT pair per file. Rows whose file has been removed since are
+        skipped by the SELECT, so the foreign key can never fail mid-flush.
+        """
+        self.cur.execute(
+            "DELETE FROM fingerprint_index WHERE path IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(self.pending_index)),),
+        )
+        self.cur.executemany(
+            "INSERT OR IGNORE INTO fingerprint_index (block, path) "
+            "SELECT ?, path FROM files WHERE path = ?",
+            [row for rows in self.pending_index.values() for row in rows],
+        )
+
     def prune_database(self):
         """Optimized pruning using set difference to eliminate disk I/O bottlenecks."""
         if not os.path.exists(self.music_folder):
-            logging.error("Music folder not found. Skipping prune.")
+            logger.error("Music folder not found. Skipping prune.")
             return
 
         print("Gathering database paths...")
         with self.conn:
             cursor = self.conn.execute("SELECT path FROM files")
-            db_paths = set(row[0] for row in cursor.fetchall())
+            db_paths = {row[0] for row in cursor}
 
         print("Scanning filesystem...")
-        disk_paths = set()
-        for root, _, files in os.walk(self.music_folder):
-            for f in files:
-                disk_paths.add(os.path.join(root, f))
+        disk_paths = {entry.path for entry in _scan_files(self.music_folder)}
 
         missing_paths = db_paths - disk_paths
 
@@ -373,66 +887,49 @@ class MusicLibraryManager:
                     "DELETE FROM audio_hashes WHERE path = ?",
                     [(p,) for p in missing_paths],
                 )
-            logging.info("Pruned %d ghost entries from database.", len(missing_paths))
+            logger.info("Pruned %d ghost entries from database.", len(missing_paths))
         else:
             print("Database is clean.")
 
     def _get_audio_hash(self, filepath):
         """Standalone hash generation for maintenance scripts."""
-        hasher = hashlib.md5()
         try:
-            cmd = [
-                "ffmpeg",
-                "-threads",
-                "1",
-                "-v",
-                "quiet",
-                "-ss",
-                "00:00:15",
-                "-t",
-                "30",
-                "-i",
-                filepath,
-                "-f",
-                "s16le",
-                "-acodec",
-                "pcm_s16le",
-                "-",
-            ]
-            with subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
-            ) as process:
-                for chunk in iter(lambda: process.stdout.read(8192 * 1024), b""):
-                    if chunk:
-                        hasher.update(chunk)
-            return hasher.hexdigest()
+            return _ffmpeg_audio_hash(filepath)
         except Exception as e:
-            logging.error(f"Audio hashing failed for {filepath}: {e}")
+            logger.error(f"Audio hashing failed for {filepath}: {e}")
             return None
 
     def hash_existing_audio(self):
         """Retroactively generates audio hashes for already-processed files."""
         print("Checking for existing files that need audio hashing...")
         # Use a dedicated connection to avoid clashing with the background writer thread.
-        with sqlite3.connect(self.db_path) as read_conn:
+        # OPTIMIZATION: One set difference in SQLite yields only the unhashed paths,
+        # instead of probing audio_hashes once per known file
+        with self._connect() as read_conn:
             read_cur = read_conn.cursor()
-            read_cur.execute("SELECT path FROM files")
-            known_paths = [row[0] for row in read_cur.fetchall()]
+            read_cur.execute("SELECT path FROM files EXCEPT SELECT path FROM audio_hashes")
+            known_paths = [row[0] for row in read_cur]
 
         added_count = 0
         # Use a separate writer connection for updates, so we don't block the background writer.
-        with sqlite3.connect(self.db_path) as write_conn:
+        with self._connect() as write_conn:
             write_cur = write_conn.cursor()
             for path in known_paths:
                 if shutdown_event.is_set():
                     break
-                if not os.path.exists(path):
-                    continue
-                write_cur.execute("SELECT 1 FROM audio_hashes WHERE path = ?", (path,))
-                if write_cur.fetchone():
+                try:
+                    st = os.stat(path)
+                except OSError:
                     continue
 
-                audio_hash = self._get_audio_hash(path)
+                # OPTIMIZATION: Files scanned before (and untouched since) already have
+                # their audio hash in scan_cache, so ffmpeg only runs on the rest
+                row = write_cur.execute(
+                    "SELECT audio_hash FROM scan_cache "
+                    "WHERE inode = ? AND size = ? AND mtime_ns = ?",
+                    (st.st_ino, st.st_size, st.st_mtime_ns),
+                ).fetchone()
+                audio_hash = row[0] if row and row[0] else self._get_audio_hash(path)
                 if audio_hash:
                     write_cur.execute(
                         "INSERT OR REPLACE INTO audio_hashes (audio_hash, path) VALUES (?, ?)",
@@ -450,8 +947,8 @@ class MusicLibraryManager:
         if not fingerprint:
             return []
         return [
-            fingerprint[i : i + self.BLOCK_SIZE]
-            for i in range(0, len(fingerprint), self.BLOCK_SIZE)
+            fingerprint[i : i + _BLOCK_SIZE]
+            for i in range(0, len(fingerprint), _BLOCK_SIZE)
         ][:16]
 
     def _update_fingerprint_cache(self, acoustid_id, fingerprint):
@@ -468,48 +965,29 @@ class MusicLibraryManager:
             )
         )
 
-        # Check if blocks exist - use a separate read-only query
-        # This is a race condition but acceptable for this use case
-        try:
-            # Use a separate connection for read-only queries
-            check_conn = sqlite3.connect(self.db_path)
-            check_cur = check_conn.cursor()
-            check_cur.execute(
-                "SELECT 1 FROM known_blocks WHERE acoustid_id = ? LIMIT 1",
-                (acoustid_id,),
-            )
-            if not check_cur.fetchone():
-                blocks = [(b, acoustid_id) for b in self._get_blocks(fingerprint)]
-                if blocks:
-                    self.db_queue.put(
-                        (
-                            "executemany",
-                            "INSERT INTO known_blocks (block, acoustid_id) VALUES (?, ?)",
-                            blocks,
-                        )
-                    )
-            check_conn.close()
-        except Exception as e:
-            logging.warning(f"Could not check known_blocks: {e}")
-
-    def _update_index(self, path, fingerprint):
-        """Updates local index via queue. NEVER call self.cur directly here!"""
-        if not fingerprint or not path:
-            return
-
-        self.db_queue.put(
-            ("execute", "DELETE FROM fingerprint_index WHERE path = ?", (path,))
-        )
-        blocks = [(b, path) for b in self._get_blocks(fingerprint)]
+        # OPTIMIZATION: The preloaded set answers "are blocks stored for this ID?"
+        # without opening a connection per file, and checking and claiming it under
+        # the lock means two threads can no longer both insert the same blocks
+        with self.cache_lock:
+            if acoustid_id in self.known_block_ids:
+                return
+            self.known_block_ids.add(acoustid_id)
+        blocks = [(b, acoustid_id) for b in self._get_blocks(fingerprint)]
         if blocks:
             self.db_queue.put(
                 (
                     "executemany",
-                    "INSERT INTO fingerprint_index (block, path) VALUES (?, ?)",
+                    "INSERT INTO known_blocks (block, acoustid_id) VALUES (?, ?)",
                     blocks,
                 )
             )
 
+    def _index_ops(self, path, fingerprint):
+        """Builds the writer op that (re)indexes a file's fingerprint blocks."""
+        if not fingerprint or not path:
+            return []
+        return [("index", path, [(b, path) for b in self._get_blocks(fingerprint)])]
+
     def _get_owned_release_ids(self, acoustid_id):
         """
         OPTIMIZATION: Use in-memory cache instead of database queries.
@@ -519,19 +997,32 @@ class MusicLibraryManager:
                 return self.owned_ids_cache[acoustid_id]
         return set()
 
-    def _calculate_quality(self, file_path):
+    def _calculate_quality(self, file_path, st=None):
         # OPTIMIZATION: Cache quality calculations
         with self.cache_lock:
             if file_path in self.quality_cache:
                 return self.quality_cache[file_path]
 
         try:
-            audio = mutagen.File(file_path)
+            # Easy tag keys ride along with the stream info, so the MusicBrainz
+            # fallback can reuse this parse instead of reopening the file.
+            # OPTIMIZATION: Open with the extension's reader directly; only files whose
+            # content doesn't match their extension pay for mutagen's format probe.
+            ext = os.path.splitext(file_path)[1].lower()
+            audio = None
+            reader = _TAG_READERS.get(ext)
+            if reader:
+                try:
+                    audio = reader(file_path)
+                except mutagen.MutagenError:
+                    audio = None
+            if audio is None:
+                audio = mutagen.File(file_path, easy=True)
             if not audio:
                 return None
             info = audio.info
-            ext = os.path.splitext(file_path)[1].lower()
-            file_size = os.path.getsize(file_path)
+            # Reuse the caller's stat result when it has one
+            file_size = st.st_size if st else os.path.getsize(file_path)
 
             format_hierarchy = {
                 ".flac": 3 * 10**15,
@@ -555,6 +1046,10 @@ class MusicLibraryManager:
                 "bitrate": bitrate,
                 "sample_rate": sample_rate,
                 "bits": bits,
+                "tags": {
+                    key: (audio.get(key) or [""])[0]
+                    for key in ("title", "artist", "album")
+                },
             }
 
             # Cache it
@@ -563,18 +1058,267 @@ class MusicLibraryManager:
 
             return quality
         except Exception as e:
-            logging.error(f"Quality check failed for {file_path}: {e}")
+            logger.error(f"Quality check failed for {file_path}: {e}")
             return None
 
-    def _fallback_musicbrainz_search(self, file_path):
+    def _crunch_file(self, entry):
+        """
+        Stage 1 unit of work: hashing/fingerprinting plus the mutagen quality scan,
+        so the header parse runs in the worker pool instead of the API stage.
+        Takes the walk's DirEntry, whose stat() result is cached on the entry.
+        """
+        path = entry.path
+        # OPTIMIZATION: (inode, size, mtime_ns) identifies unchanged content, so a
+        # cache hit skips the subprocesses and the header parse entirely
         try:
-            audio = mutagen.File(file_path, easy=True)
-            if not audio:
-                return []
+            st = entry.stat()
+            key = (st.st_ino, st.st_size, st.st_mtime_ns)
+        except OSError:
+            st = key = None
+
+        content_hash = None
+        if key:
+            read_conn = self._read_conn()
+            row = read_conn.execute(
+                "SELECT audio_hash, duration, fingerprint, quality FROM scan_cache "
+                "WHERE inode = ? AND size = ? AND mtime_ns = ?",
+                key,
+            ).fetchone()
+            if not row:
+                # OPTIMIZATION: Byte-identical copies share a scan. Reading the file is
+                # far cheaper than decoding it, so the ffmpeg/fpcalc pass is skipped
+                # and the copy reaches the audio-hash duplicate check in Stage 2.
+                try:
+                    content_hash = _content_hash(path)
+                except OSError as e:
+                    logger.warning(f"Content hashing failed for {path}: {e}")
+                else:
+                    row = read_conn.execute(
+                        "SELECT audio_hash, duration, fingerprint, quality FROM scan_cache "
+                        "WHERE content_hash = ? AND size = ? LIMIT 1",
+                        (content_hash, st.st_size),
+                    ).fetchone()
+            if row:
+                audio_hash, duration, fingerprint, quality = row
+                if content_hash:
+                    # Cache the copy under its own identity too, so later runs
+                    # hit the (inode, size, mtime) key instead of rehashing it
+                    self.db_queue.put(
+                        (
+                            "execute",
+                            "INSERT OR REPLACE INTO scan_cache "
+                            "(inode, size, mtime_ns, audio_hash, duration, fingerprint, quality, content_hash) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (*key, *row, content_hash),
+                        )
+                    )
+                return {
+                    "path": path,
+                    "hash": audio_hash,
+                    "duration": duration,
+                    "fingerprint": fingerprint,
+                    "error": None,
+                    "quality": _json_loads(quality),
+                }
 
-            title = audio.get("title", [""])[0]
-            artist = audio.get("artist", [""])[0]
-            album = audio.get("album", [""])[0]
+        result = _cpu_bound_worker(path)
+        if not result["error"] and not shutdown_event.is_set():
+            result["quality"] = self._calculate_quality(path, st)
+            # Only complete scans are cached; failures are retried next run
+            if key and result["fingerprint"] and result["quality"]:
+                self.db_queue.put(
+                    (
+                        "execute",
+                        "INSERT OR REPLACE INTO scan_cache "
+                        "(inode, size, mtime_ns, audio_hash, duration, fingerprint, quality, content_hash) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            *key,
+                            result["hash"],
+                            result["duration"],
+                            result["fingerprint"],
+                            _json_dumps(result["quality"]),
+                            content_hash,
+                        ),
+                    )
+                )
+        return result
+
+    def _lookup_acoustid(self, fingerprint, duration):
+        """
+        AcoustID lookup backed by the persistent lookup_cache table.
+        OPTIMIZATION: A cached fingerprint costs one indexed read instead of a
+        rate-limited HTTP round trip. Only successful responses that found
+        something are stored, so unknown fingerprints are asked about again.
+        """
+        prefetched = self.prefetched_lookups.pop(fingerprint, None)
+        if prefetched:
+            return prefetched
+        row = (
+            self._read_conn()
+            .execute(
+                "SELECT payload FROM lookup_cache WHERE fingerprint = ?", (fingerprint,)
+            )
+            .fetchone()
+        )
+        if row:
+            return _json_loads(row[0])
+
+        resp = _slim_lookup(
+            self._call_acoustid(
+                {"duration": int(duration), "fingerprint": fingerprint}
+            )
+        )
+        if resp.get("status") == "ok" and resp.get("results"):
+            self._cache_lookup(fingerprint, resp)
+        return resp
+
+    def _prefetch_lookups(self, cpu_results):
+        """
+        Resolves uncached fingerprints with batched /v2/lookup calls before the
+        per-file API work.
+        OPTIMIZATION: One request carries LOOKUP_BATCH_SIZE fingerprints as indexed
+        fingerprint.N/duration.N fields, so N files cost N/20 rate-limited round trips.
+        Anything a batch fails to resolve falls back to the per-file lookup.
+        """
+        read_conn = self._read_conn()
+        pending = [
+            data
+            for data in cpu_results
+            if data.get("fingerprint")
+            and data.get("quality")
+            and data["hash"] not in self.audio_hash_cache
+            and not read_conn.execute(
+                "SELECT 1 FROM lookup_cache WHERE fingerprint = ?",
+                (data["fingerprint"],),
+            ).fetchone()
+        ]
+        size = self.LOOKUP_BATCH_SIZE
+        for start in range(0, len(pending), size):
+            if shutdown_event.is_set():
+                return
+            batch = pending[start : start + size]
+            fields = {}
+            for i, data in enumerate(batch):
+                fields[f"fingerprint.{i}"] = data["fingerprint"]
+                fields[f"duration.{i}"] = int(data["duration"])
+            try:
+                resp = self._call_acoustid(fields)
+            except AcoustIDError as e:
+                logger.warning(f"Batched AcoustID lookup failed: {e}")
+                continue
+            if resp.get("status") != "ok":
+                continue
+            for entry in resp.get("fingerprints", []):
+                fingerprint = batch[int(entry["index"])]["fingerprint"]
+                found = _slim_lookup(
+                    {"status": "ok", "results": entry.get("results", [])}
+                )
+                # Kept for this run either way; only hits outlive it
+                self.prefetched_lookups[fingerprint] = found
+                if found["results"]:
+                    self._cache_lookup(fingerprint, found)
+
+    def _post_lookup(self, fields):
+        """
+        POSTs lookup fields after the prebuilt client/format/meta prefix.
+        Returns (throttled, parsed JSON, Retry-After seconds or None); the JSON is
+        None for a bare 429/5xx.
+        """
+        try:
+            response = _ACOUSTID_SESSION.post(
+                acoustid.API_BASE_URL + "lookup",
+                data=f"{self.lookup_body_prefix}&{urlencode(fields)}",
+                headers=_ACOUSTID_HEADERS,
+                timeout=_ACOUSTID_TIMEOUT,
+            )
+        except requests.exceptions.RequestException as e:
+            raise AcoustIDError(f"HTTP request failed: {e}") from e
+        retry_after = _retry_after(response)
+        try:
+            resp = _json_loads(response.content)
+        except ValueError as e:
+            if response.status_code in _ACOUSTID_BACKOFF_STATUSES:
+                return True, None, retry_after
+            raise AcoustIDError("response is not valid JSON") from e
+        error = resp.get("error") if resp.get("status") == "error" else None
+        if isinstance(error, dict) and error.get("code") in _ACOUSTID_BACKOFF_CODES:
+            return True, resp, retry_after
+        throttled = response.status_code in _ACOUSTID_BACKOFF_STATUSES
+        return throttled, resp, retry_after
+
+    def _wait_api_slot(self):
+        """
+        Reserves the next AcoustID request slot, 1/api_rate after the previous one.
+        Only the reservation holds api_lock; the wait itself does not, so concurrent
+        workers are spaced out without queueing behind each other's requests.
+        """
+        with self.api_lock:
+            now = time.monotonic()
+            slot = max(now, self.next_api_slot)
+            self.next_api_slot = slot + 1.0 / self.api_rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _call_acoustid(self, fields):
+        """
+        Runs a paced AcoustID lookup, backing off and retrying while the service
+        pushes back. This is the only layer that retries throttling and 5xx
+        answers, waiting as long as Retry-After asks when the service sends it.
+        Raises AcoustIDError when the request fails, is still being refused after
+        API_RETRIES retries, or a shutdown interrupts the backoff.
+        """
+        for attempt in range(self.API_RETRIES + 1):
+            self._wait_api_slot()
+            throttled, resp, retry_after = self._post_lookup(fields)
+            self._adjust_api_rate(throttled)
+            if not throttled:
+                return resp
+            if attempt < self.API_RETRIES:
+                delay = 2**attempt if retry_after is None else retry_after
+                if shutdown_event.wait(min(delay, self.API_MAX_BACKOFF)):
+                    raise AcoustIDError("shutdown requested during backoff")
+        raise AcoustIDError(
+            f"AcoustID still refusing requests after {self.API_RETRIES + 1} attempts"
+        )
+
+    def _cache_lookup(self, fingerprint, resp):
+        """Persists a successful response to lookup_cache."""
+        self.db_queue.put(
+            (
+                "execute",
+                "INSERT OR REPLACE INTO lookup_cache (fingerprint, payload, ts) VALUES (?, ?, ?)",
+                (fingerprint, _json_dumps(resp), time.time()),
+            )
+        )
+
+    def _adjust_api_rate(self, throttled):
+        """AIMD step for the shared AcoustID request rate."""
+        with self.api_lock:
+            if throttled:
+                self.api_rate = max(self.API_MIN_RATE, self.api_rate / 2)
+                logger.warning(
+                    f"AcoustID asked us to slow down; now {self.api_rate:.2f} req/s"
+                )
+            else:
+                self.api_rate = min(
+                    self.API_MAX_RATE, self.api_rate + self.API_RATE_STEP
+                )
+
+    def _fallback_musicbrainz_search(self, file_path, tags=None):
+        try:
+            if tags is None:
+                audio = mutagen.File(file_path, easy=True)
+                if not audio:
+                    return []
+                tags = {
+                    key: (audio.get(key) or [""])[0]
+                    for key in ("title", "artist", "album")
+                }
+
+            title = tags["title"]
+            artist = tags["artist"]
+            album = tags["album"]
 
             if not title or not artist:
                 return []
@@ -594,7 +1338,7 @@ class MusicLibraryManager:
                 try:
                     result = musicbrainzngs.search_recordings(query=query, limit=5)
                 except Exception as e:
-                    logging.error(f"MB API Error: {e}")
+                    logger.error(f"MB API Error: {e}")
                     return []
                 finally:
                     self.last_mb_call = time.time()
@@ -603,14 +1347,8 @@ class MusicLibraryManager:
             for rec in result.get("recording-list", []):
                 rec_title, rec_id = rec.get("title", "Unknown"), rec.get("id")
                 for rel in rec.get("release-list", []):
-                    rel_id, track_pos, disc_pos = rel.get("id"), 1, 1
-                    if "medium-list" in rel:
-                        for med in rel["medium-list"]:
-                            disc_pos = med.get("position", 1)
-                            for trk in med.get("track-list", []):
-                                if trk.get("recording", {}).get("id") == rec_id:
-                                    track_pos = trk.get("number", 1)
-                                    break
+                    rel_id = rel.get("id")
+                    track_pos, disc_pos = _locate_mb_track(rel, rec_id)
 
                     mock_release = {
                         "id": rel_id,
@@ -618,18 +1356,8 @@ class MusicLibraryManager:
                         "artists": [{"name": artist}],
                         "date": {"year": rel.get("date", "0000")[:4]},
                         "country": rel.get("country", "XX"),
-                        "mediums": [
-                            {
-                                "position": disc_pos,
-                                "tracks": [
-                                    {
-                                        "position": track_pos,
-                                        "title": rec_title,
-                                        "recording": {"id": rec_id},
-                                    }
-                                ],
-                            }
-                        ],
+                        "track_no": track_pos,
+                        "disc_no": disc_pos,
                     }
                     candidates.append(
                         {
@@ -652,8 +1380,7 @@ class MusicLibraryManager:
             candidates.sort(key=lambda x: x["similarity"], reverse=True)
             return candidates
         except Exception as e:
-            logging.error(f"Fallback search error: {e}")
-            traceback.print_exc()
+            logger.exception(f"Fallback search error: {e}")
             return []
 
     def _get_candidates(self, results):
@@ -673,10 +1400,8 @@ class MusicLibraryManager:
                             "similarity": match_score,
                             "recording_title": rec_title,
                             "album_title": release.get("title", "Unknown Album"),
-                            "artist": release.get("artists", [{}])[0].get(
-                                "name", "Unknown Artist"
-                            ),
-                            "date": str(release.get("date", {}).get("year", "Unknown")),
+                            "artist": _first_artist_name(release) or "Unknown Artist",
+                            "date": _release_year(release, "Unknown"),
                             "country": release.get("country", "XX"),
                             "release": release,
                             "recording": recording,
@@ -733,6 +1458,11 @@ class MusicLibraryManager:
     def close(self):
         self._stop_audio()
 
+        # Let queued file moves land before the writer and connection go away
+        if self.io_executor:
+            self.io_executor.shutdown(wait=True)
+            self.io_executor = None
+
         # Ensure the background DB writer thread shuts down cleanly
         try:
             if hasattr(self, "db_queue") and self.db_queue:
@@ -747,7 +1477,7 @@ class MusicLibraryManager:
                 self.conn.close()
                 self.conn = None
             except sqlite3.Error as e:
-                logging.error(f"Error closing database: {e}")
+                logger.error(f"Error closing database: {e}")
 
     def _prompt_user_selection(self, file_path, candidates):
         filename = os.path.basename(file_path)
@@ -760,22 +1490,23 @@ class MusicLibraryManager:
             while True:
                 start_idx = current_page * page_size
                 current_batch = candidates[start_idx : start_idx + page_size]
-                print(f"\n[!] Ambiguous API Match for file: {file_path}")
-                print(f"    Page {current_page + 1}/{total_pages}")
-                print(
-                    f"{'#':<3} {'Own':<3} {'Sim':<5} {'Ctry':<4} {'Date':<6} {'Artist':<25} {'Album'}"
-                )
-                print("-" * 80)
-
+                # OPTIMIZATION: Build the page and write it in one call instead of
+                # a print (lock + flush) per line
+                lines = [
+                    f"\n[!] Ambiguous API Match for file: {file_path}",
+                    f"    Page {current_page + 1}/{total_pages}",
+                    f"{'#':<3} {'Own':<3} {'Sim':<5} {'Ctry':<4} {'Date':<6} {'Artist':<25} {'Album'}",
+                    "-" * 80,
+                ]
                 for i, c in enumerate(current_batch):
                     global_idx = start_idx + i + 1
                     sim_pct = f"{int(c['similarity'] * 100)}%"
                     own_mark = "*" if c.get("is_owned") else ""
-                    print(
+                    lines.append(
                         f"{global_idx:<3} {own_mark:<3} {sim_pct:<5} {c['country']:<4} {c['date']:<6} {c['artist'][:25]:<25} {c['album_title']}"
                     )
-
-                print("-" * 80)
+                lines.append("-" * 80)
+                sys.stdout.write("\n".join(lines) + "\n")
                 prompt_options = []
                 if current_page < total_pages - 1:
                     prompt_options.append("(N)ext")
@@ -837,26 +1568,52 @@ class MusicLibraryManager:
         if os.path.abspath(src_path) == os.path.abspath(target_path):
             return target_path
 
-        base, ext = os.path.splitext(clean_filename)
-        counter = 1
-        while os.path.exists(target_path):
-            if os.path.abspath(src_path) == os.path.abspath(target_path):
-                return target_path
-            target_path = os.path.join(target_dir, f"{base} ({counter}){ext}")
-            counter += 1
+        if os.path.exists(target_path):
+            # OPTIMIZATION: On a collision, list the directory once and probe numbered
+            # names in memory instead of stat-ing each candidate. Names are compared
+            # casefolded so case-insensitive filesystems can't hide a clash.
+            try:
+                taken = {name.casefold() for name in os.listdir(target_dir)}
+            except OSError:
+                # Unlistable directory: probe each candidate on disk instead, so
+                # the rename below can never overwrite an existing file
+                taken = None
+
+            def is_taken(name):
+                if taken is None:
+                    return os.path.exists(os.path.join(target_dir, name))
+                return name.casefold() in taken
+
+            src_abs = os.path.abspath(src_path)
+            base, ext = os.path.splitext(clean_filename)
+            candidate = clean_filename
+            counter = 1
+            while is_taken(candidate):
+                if src_abs == os.path.abspath(target_path):
+                    return target_path
+                candidate = f"{base} ({counter}){ext}"
+                target_path = os.path.join(target_dir, candidate)
+                counter += 1
 
         if self.dry_run:
-            logging.info(f"[DRY RUN] {operation}: {src_path} -> {target_path}")
+            logger.info(f"[DRY RUN] {operation}: {src_path} -> {target_path}")
             return target_path
 
         try:
             if operation == "move":
-                shutil.move(src_path, target_path)
+                # OPTIMIZATION: Source and destination almost always share a filesystem,
+                # where a single atomic rename suffices; shutil.move copies across devices
+                try:
+                    os.rename(src_path, target_path)
+                except OSError as e:
+                    if e.errno != errno.EXDEV:
+                        raise
+                    shutil.move(src_path, target_path)
             else:
                 shutil.copy2(src_path, target_path)
             return target_path
         except Exception as e:
-            logging.error(f"Failed to {operation} {src_path} -> {target_path}: {e}")
+            logger.error(f"Failed to {operation} {src_path} -> {target_path}: {e}")
             if (
                 dir_created
                 and os.path.exists(target_dir)
@@ -872,10 +1629,17 @@ class MusicLibraryManager:
         if not os.path.exists(self.music_folder):
             return
         print("Cleaning up empty source folders...")
+        # Bottom-up, so a parent is checked after its emptied children are gone.
+        # OPTIMIZATION: Peek at the first entry and only rmdir directories that are
+        # actually empty, instead of attempting (and failing) rmdir on every folder.
         for root, dirs, _ in os.walk(self.music_folder, topdown=False):
             for name in dirs:
+                path = os.path.join(root, name)
                 try:
-                    os.rmdir(os.path.join(root, name))
+                    with os.scandir(path) as it:
+                        if next(it, None) is not None:
+                            continue
+                    os.rmdir(path)
                 except OSError:
                     pass
 
@@ -883,28 +1647,29 @@ class MusicLibraryManager:
         self, path, acoustid_id, release_id, quality, dispose_source=False
     ):
         """
-        Check for duplicates using a separate read-only connection.
-        OPTIMIZATION: Cache frequently checked data
+        Check for duplicates using this thread's read-only connection.
+        OPTIMIZATION: SQLite returns only the best-scoring existing copy, straight
+        off the quality-ordered idx_files_active, instead of an arbitrary row.
         """
         try:
-            read_conn = sqlite3.connect(self.db_path)
-            read_cur = read_conn.cursor()
+            read_cur = self._read_conn().cursor()
 
             if self.global_dedup:
                 read_cur.execute(
-                    "SELECT path, quality_score FROM files WHERE acoustid_id = ? AND processed = 1",
+                    """SELECT path, quality_score FROM files WHERE acoustid_id = ? AND processed = 1
+                    ORDER BY quality_score DESC LIMIT 1""",
                     (acoustid_id,),
                 )
             else:
                 read_cur.execute(
-                    "SELECT path, quality_score FROM files WHERE acoustid_id = ? AND album_id = ? AND processed = 1",
+                    """SELECT path, quality_score FROM files WHERE acoustid_id = ? AND album_id = ? AND processed = 1
+                    ORDER BY quality_score DESC LIMIT 1""",
                     (acoustid_id, release_id),
                 )
 
             existing = read_cur.fetchone()
-            read_conn.close()
         except sqlite3.Error as e:
-            logging.error(f"Failed to check for duplicates: {e}")
+            logger.error(f"Failed to check for duplicates: {e}")
             return True
 
         if not existing:
@@ -919,15 +1684,17 @@ class MusicLibraryManager:
                 f" -> Upgrading existing file (Quality: {existing_score} -> {quality['score']})"
             )
             if not self.dry_run:
-                self._safe_move(existing_path, self.dup_folder, operation="move")
+                self._dispose(existing_path, self.dup_folder, block=True)
                 self.db_queue.put(
                     ("execute", "DELETE FROM files WHERE path = ?", (existing_path,))
                 )
+                with self.cache_lock:
+                    self.score_cache.pop(existing_path, None)
             return True
         else:
             print(f" -> Duplicate found (lower/equal quality).")
             if dispose_source and not self.dry_run:
-                self._safe_move(path, self.dup_folder, operation="move")
+                self._dispose(path, self.dup_folder)
                 self.db_queue.put(
                     (
                         "execute",
@@ -943,61 +1710,101 @@ class MusicLibraryManager:
                         ),
                     )
                 )
+                with self.cache_lock:
+                    self.score_cache[path] = quality["score"]
             return False
 
-    def _apply_tags(self, file_path, meta):
+    def _apply_tags(self, file_path, meta, ext):
+        """Writes meta into the file's native tags; ext is the lowercased extension."""
         if self.dry_run:
             return
         try:
+            if ext == ".mp3":
+                # OPTIMIZATION: Parse the ID3 tag once and write it once; opening the
+                # file through mutagen.File first parsed the same tag a second time
+                try:
+                    tags = ID3(file_path)
+                except ID3NoHeaderError:
+                    tags = ID3()
+                for make_frame, key in _ID3_FRAMES:
+                    tags.add(make_frame(text=meta[key]))
+                # Reuse existing padding; only a tag that outgrows it (or a new one)
+                # rewrites the audio data, and then leaves 1 KB for later edits
+                tags.save(
+                    file_path,
+                    padding=lambda info: info.padding if info.padding >= 0 else 1024,
+                )
+                return
+
             audio = mutagen.File(file_path)
             if not audio:
                 return
-            ext = file_path.lower()
-            if ext.endswith(".mp3"):
-                tags = ID3(file_path)
-                tags.add(TIT2(encoding=3, text=meta["title"]))
-                tags.add(TALB(encoding=3, text=meta["album"]))
-                tags.add(TPE1(encoding=3, text=meta["artist"]))
-                tags.add(TPE2(encoding=3, text=meta["album_artist"]))
-                tags.add(TRCK(encoding=3, text=str(meta["track_no"])))
-                tags.add(TPOS(encoding=3, text=str(meta["disc_no"])))
-                tags.save()
-            elif ext.endswith((".flac", ".wav")):
+            if ext in (".flac", ".wav"):
                 audio["title"], audio["album"] = meta["title"], meta["album"]
                 audio["artist"], audio["albumartist"] = (
                     meta["artist"],
                     meta["album_artist"],
                 )
-                audio["tracknumber"], audio["discnumber"] = str(meta["track_no"]), str(
-                    meta["disc_no"]
+                audio["tracknumber"], audio["discnumber"] = (
+                    meta["track_no"],
+                    meta["disc_no"],
                 )
                 audio.save()
-            elif ext.endswith((".m4a", ".mp4")):
+            elif ext in (".m4a", ".mp4"):
                 audio["\xa9nam"], audio["\xa9alb"] = meta["title"], meta["album"]
                 audio["\xa9ART"], audio["aART"] = meta["artist"], meta["album_artist"]
                 audio["trkn"], audio["disk"] = [(int(meta["track_no"]), 0)], [
                     (int(meta["disc_no"]), 0)
                 ]
                 audio.save()
-            elif ext.endswith(".wma"):
+            elif ext == ".wma":
                 audio["Title"], audio["WM/AlbumTitle"] = meta["title"], meta["album"]
                 audio["Author"], audio["WM/AlbumArtist"] = (
                     meta["artist"],
                     meta["album_artist"],
                 )
-                audio["WM/TrackNumber"], audio["WM/PartOfSet"] = str(
-                    meta["track_no"]
-                ), str(meta["disc_no"])
+                audio["WM/TrackNumber"], audio["WM/PartOfSet"] = (
+                    meta["track_no"],
+                    meta["disc_no"],
+                )
                 audio.save()
         except Exception as e:
-            logging.error(f"Tagging Error {file_path}: {e}")
-            traceback.print_exc()
+            logger.exception(f"Tagging Error {file_path}: {e}")
 
     def _sanitize_name(self, name):
         if not name:
             return "Unknown"
-        cleaned = name.replace("/", "-").replace("\\", "-")
-        return "".join(c for c in cleaned if c.isalnum() or c in " -_.").strip()
+        return _sanitize(name)
+
+    def _dispose(self, src_path, target_dir, block=False):
+        """
+        Moves a file that is leaving the pipeline (to the dup or unresolved folder).
+        OPTIMIZATION: During a run the move is queued on a single background I/O
+        thread, so cross-device copies never stall a worker. One thread keeps
+        these moves from racing each other for the same target name.
+
+        block=True waits for the move, for callers that need the old path freed
+        (an upgraded file may be organized into the slot it leaves behind).
+        """
+        if self.io_executor is None:
+            return self._safe_move(src_path, target_dir, operation="move")
+        future = self.io_executor.submit(
+            self._safe_move, src_path, target_dir, operation="move"
+        )
+        if block:
+            return future.result()
+        self.pending_moves.add(future)
+        future.add_done_callback(self.pending_moves.discard)
+
+    def _finish_run(self):
+        """Waits for queued moves, then drains and stops the DB writer."""
+        if self.pending_moves:
+            wait(list(self.pending_moves))
+        if self.io_executor:
+            self.io_executor.shutdown(wait=True)
+            self.io_executor = None
+        self.db_queue.put(None)
+        self.writer_thread.join()
 
     def _organize_file(
         self, current_path, artist_dir, album_dir, filename, operation="move"
@@ -1014,7 +1821,7 @@ class MusicLibraryManager:
                 return (self.audio_hash_cache[audio_hash],)
 
         try:
-            read_conn = sqlite3.connect(self.db_path)
+            read_conn = self._connect()
             read_cur = read_conn.cursor()
             read_cur.execute(
                 "SELECT path FROM audio_hashes WHERE audio_hash = ?", (audio_hash,)
@@ -1029,7 +1836,7 @@ class MusicLibraryManager:
 
             return result
         except sqlite3.Error as e:
-            logging.error(f"Failed to query audio hash: {e}")
+            logger.error(f"Failed to query audio hash: {e}")
             return None
 
     def process_library(self):
@@ -1040,109 +1847,63 @@ class MusicLibraryManager:
         self.db_queue = Queue()
         self.writer_thread = threading.Thread(target=self._db_writer_thread, daemon=True)
         self.writer_thread.start()
+        self.io_executor = ThreadPoolExecutor(max_workers=1)
 
         # --- PRELOAD CACHE ---
         self._preload_cache()
 
         # --- GATHER & FILTER ---
-        print("Scanning directories...")
-        all_files = [
-            os.path.join(r, f)
-            for r, _, fs in os.walk(self.music_folder)
-            for f in fs
-            if f.lower().endswith((".mp3", ".flac", ".m4a", ".mp4", ".wma", ".wav"))
-        ]
-
         # Read from a separate connection so this select cannot hold a read-lock during writer activity.
-        with sqlite3.connect(self.db_path) as read_conn:
+        with self._connect() as read_conn:
             read_cur = read_conn.cursor()
             read_cur.execute("SELECT path FROM files WHERE processed = 1")
-            processed_set = {row[0] for row in read_cur.fetchall()}
+            processed_set = {row[0] for row in read_cur}
 
-        pending_files = [f for f in all_files if f not in processed_set]
         if shutdown_event.is_set():
-            self.db_queue.put(None)
-            writer_thread.join()
+            self._finish_run()
             return
-        print(f"Found {len(pending_files)} files needing processing.\n")
 
-        if not pending_files:
-            self.db_queue.put(None)
-            writer_thread.join()
-            return
-
-        ambiguous_queue = []
-
-        # --- PHASE 1: CPU-BOUND CRUNCHING (OPTIMIZED ThreadPool) ---
-        print(
-            f"Stage 1: Crunching audio data (Hashing & Fingerprinting) - {self.cpu_workers} workers..."
+        # OPTIMIZATION: The directory walk is a lazy generator feeding Stage 1, so
+        # crunching starts with the first file found instead of after a full scan.
+        # Folders this run moves files into are never walked, so a moved file
+        # cannot be picked up a second time.
+        print("Scanning directories...")
+        skip_dirs = {self.dup_folder, self.unresolved_folder, self.destination_folder}
+        pending_files = (
+            entry
+            for entry in _scan_files(self.music_folder, skip_dirs)
+            if _is_audio_file(entry.name) and entry.path not in processed_set
         )
-        cpu_results = []
-        # OPTIMIZATION: Increased worker count for I/O-bound audio operations
-        with ThreadPoolExecutor(max_workers=self.cpu_workers) as executor:
-            futures = [executor.submit(_cpu_bound_worker, path) for path in pending_files]
-            for future in as_completed(futures):
-                if shutdown_event.is_set():
-                    break
-                try:
-                    result = future.result()
-                    if result.get("error"):
-                        logging.warning(
-                            f"Worker error on {result['path']}: {result['error']}"
-                        )
-                        self._safe_move(
-                            result["path"], self.unresolved_folder, operation="move"
-                        )
-                    else:
-                        cpu_results.append(result)
-                except Exception as e:
-                    logging.error(f"Future error: {e}")
-                    traceback.print_exc()
 
-        if shutdown_event.is_set():
-            self.db_queue.put(None)
-            self.writer_thread.join()
-            return
-
-        # --- PHASE 2: NETWORK & API RESOLUTION (OPTIMIZED ThreadPool) ---
-        print(
-            f"\nStage 2: Fetching API Metadata & Organizing - {self.api_workers} workers..."
-        )
+        ambiguous_queue = []
 
         def _api_worker(file_data):
             path = file_data["path"]
-            quality = self._calculate_quality(path)
+            quality = file_data.get("quality")
             if not quality:
                 return {"status": "skip"}
 
             audio_hash = file_data["hash"]
             if audio_hash:
+                # Copies in flight together are checked before either reaches
+                # audio_hash_cache. The first claims the hash; later copies wait
+                # until it settles and then get the usual quality comparison.
+                with self.cache_lock:
+                    claimant = self.hash_claims.setdefault(audio_hash, path)
+                    if claimant != path:
+                        self.hash_waiting.setdefault(audio_hash, []).append(file_data)
+                if claimant != path:
+                    return {"status": "deferred", "path": path}
                 dup_row = self._query_audio_hash_safely(audio_hash)
                 if dup_row:
                     existing_path = dup_row[0]
-                    try:
-                        read_conn = sqlite3.connect(self.db_path)
-                        read_cur = read_conn.cursor()
-                        read_cur.execute(
-                            "SELECT quality_score FROM files WHERE path = ?",
-                            (existing_path,),
-                        )
-                        existing_score_row = read_cur.fetchone()
-                        read_conn.close()
-                    except sqlite3.Error as e:
-                        logging.error(f"Failed to query quality score: {e}")
-                        existing_score_row = None
-
-                    existing_score = (
-                        existing_score_row[0]
-                        if existing_score_row and existing_score_row[0] is not None
-                        else 0.0
-                    )
+                    with self.cache_lock:
+                        existing_score = self.score_cache.get(existing_path) or 0.0
 
                     if quality["score"] > existing_score:
                         if not self.dry_run:
-                            self._safe_move(
-                                existing_path, self.dup_folder, operation="move"
+                            self._dispose(
+                                existing_path, self.dup_folder, block=True
                             )
                             self.db_queue.put(
                                 (
@@ -1158,8 +1919,10 @@ class MusicLibraryManager:
                                     (path, audio_hash),
                                 )
                             )
+                            with self.cache_lock:
+                                self.score_cache.pop(existing_path, None)
                     else:
-                        self._safe_move(path, self.dup_folder, operation="move")
+                        self._dispose(path, self.dup_folder)
                         if not self.dry_run:
                             self.db_queue.put(
                                 (
@@ -1170,22 +1933,17 @@ class MusicLibraryManager:
                             )
                     return {"status": "duplicate_handled"}
 
-            time.sleep(self.API_SLEEP)
-            try:
-                if not file_data.get("fingerprint"):
-                    return {"status": "unresolved", "path": path}
-
-                import acoustid as acoustid_module
+            if not file_data.get("fingerprint"):
+                return {"status": "unresolved", "path": path}
 
-                resp = acoustid_module.lookup(
-                    self.api_key,
-                    file_data["fingerprint"],
-                    file_data["duration"],
-                    meta="recordings releases tracks",
+            # A failed lookup leaves the file in place for the next run; anything
+            # other than an AcoustID failure propagates to _api_batch
+            try:
+                resp = self._lookup_acoustid(
+                    file_data["fingerprint"], file_data["duration"]
                 )
-            except Exception as e:
-                logging.error(f"API failed for {path}: {e}")
-                traceback.print_exc()
+            except AcoustIDError as e:
+                logger.warning(f"AcoustID lookup failed for {path}: {e}")
                 return {"status": "error", "path": path}
 
             candidates = (
@@ -1194,7 +1952,7 @@ class MusicLibraryManager:
                 else []
             )
             if not candidates:
-                candidates = self._fallback_musicbrainz_search(path)
+                candidates = self._fallback_musicbrainz_search(path, quality["tags"])
             if not candidates:
                 return {"status": "unresolved", "path": path}
 
@@ -1271,34 +2029,133 @@ class MusicLibraryManager:
                     "quality": quality,
                 }
 
-        # OPTIMIZATION: Increased worker count for I/O-bound API operations
-        with ThreadPoolExecutor(max_workers=self.api_workers) as executor:
-            futures = [executor.submit(_api_worker, data) for data in cpu_results]
-            for future in as_completed(futures):
+        def _handle_api_result(res):
+            if res["status"] == "unresolved":
+                self._dispose(res["path"], self.unresolved_folder)
+            elif res["status"] == "needs_user":
+                ambiguous_queue.append(res)
+            elif res["status"] == "auto_resolved":
+                for idx, match in enumerate(res["match"]):
+                    self._process_match_for_file(
+                        res["path"],
+                        res["acoustid"],
+                        res["data"]["fingerprint"],
+                        res["data"]["duration"],
+                        res["quality"],
+                        res["data"]["hash"],
+                        match,
+                        idx == len(res["match"]) - 1,
+                    )
+
+        def _release_hash_claim(res):
+            # Called once a result is handled, whatever its status: copies that
+            # waited on it are returned to go through Stage 2 again
+            audio_hash, path = res["data"].get("hash"), res["data"]["path"]
+            with self.cache_lock:
+                if not audio_hash or self.hash_claims.get(audio_hash) != path:
+                    return []
+                del self.hash_claims[audio_hash]
+                return self.hash_waiting.pop(audio_hash, [])
+
+        def _api_batch(batch):
+            # One batched AcoustID request warms the lookups for the whole batch.
+            # If it breaks, each file falls back to its own lookup.
+            try:
+                self._prefetch_lookups(batch)
+            except Exception as e:
+                logger.exception(f"Batched AcoustID prefetch error: {e}")
+            results = []
+            for file_data in batch:
                 if shutdown_event.is_set():
                     break
                 try:
-                    res = future.result()
-                    if res["status"] == "unresolved":
-                        self._safe_move(
-                            res["path"], self.unresolved_folder, operation="move"
-                        )
-                    elif res["status"] == "needs_user":
-                        ambiguous_queue.append(res)
-                    elif res["status"] == "auto_resolved":
-                        for idx, match in enumerate(res["match"]):
-                            self._process_match_for_file(
-                                res["path"],
-                                res["acoustid"],
-                                res["data"]["fingerprint"],
-                                res["quality"],
-                                res["data"]["hash"],
-                                match,
-                                idx == len(res["match"]) - 1,
-                            )
+                    res = _api_worker(file_data)
                 except Exception as e:
-                    logging.error(f"API worker error: {e}")
-                    traceback.print_exc()
+                    logger.exception(f"API worker error: {e}")
+                    res = {"status": "error", "path": file_data["path"]}
+                finally:
+                    # Duplicates and early exits never reach the lookup that pops it
+                    self.prefetched_lookups.pop(file_data.get("fingerprint"), None)
+                res.setdefault("data", file_data)
+                results.append(res)
+            return results
+
+        # --- PHASES 1 & 2: CRUNCHING FEEDS API RESOLUTION ---
+        # OPTIMIZATION: Stage 2 no longer waits for Stage 1 to finish. Every
+        # LOOKUP_BATCH_SIZE crunched files go to the API pool as one batch, and
+        # finished batches are organized here while the pools keep working, so
+        # decoding, network waits and file moves overlap.
+        print(
+            f"Stage 1: Crunching audio data (Hashing & Fingerprinting) - {self.cpu_workers} workers..."
+        )
+        print(
+            f"Stage 2: Fetching API Metadata & Organizing - {self.api_workers} workers..."
+        )
+        crunched = 0
+        batch = []
+        # OPTIMIZATION: Keep at most 2x workers in flight instead of queueing a future
+        # per file up front, so memory stays flat on very large libraries
+        max_in_flight = 2 * self.cpu_workers
+        entry_iter = iter(pending_files)
+        scanning = True
+        crunch_pending, api_pending = set(), set()
+        cpu_pool = ThreadPoolExecutor(max_workers=self.cpu_workers)
+        api_pool = ThreadPoolExecutor(max_workers=self.api_workers)
+        with cpu_pool, api_pool:
+            while not shutdown_event.is_set():
+                while scanning and len(crunch_pending) < max_in_flight:
+                    entry = next(entry_iter, None)
+                    if entry is None:
+                        scanning = False
+                        break
+                    crunch_pending.add(cpu_pool.submit(self._crunch_file, entry))
+                if batch and (
+                    len(batch) >= self.LOOKUP_BATCH_SIZE
+                    or not (scanning or crunch_pending)
+                ):
+                    api_pending.add(api_pool.submit(_api_batch, batch))
+                    batch = []
+                if not (crunch_pending or api_pending):
+                    break
+
+                done, _ = wait(crunch_pending | api_pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in crunch_pending:
+                        crunch_pending.discard(future)
+                        try:
+                            result = future.result()
+                            if result.get("error"):
+                                logger.warning(
+                                    f"Worker error on {result['path']}: {result['error']}"
+                                )
+                                self._dispose(result["path"], self.unresolved_folder)
+                            else:
+                                crunched += 1
+                                batch.append(result)
+                        except Exception as e:
+                            logger.exception(f"Future error: {e}")
+                        continue
+
+                    api_pending.discard(future)
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        logger.exception(f"API batch error: {e}")
+                        continue
+                    for res in results:
+                        if shutdown_event.is_set():
+                            break
+                        try:
+                            _handle_api_result(res)
+                        except Exception as e:
+                            logger.exception(f"API worker error: {e}")
+                        finally:
+                            batch.extend(_release_hash_claim(res))
+
+        if shutdown_event.is_set():
+            self._finish_run()
+            return
+        print(f"Crunched {crunched} files needing processing.\n")
 
         # --- PHASE 3: INTERACTIVE RESOLUTION ---
         if ambiguous_queue:
@@ -1321,6 +2178,7 @@ class MusicLibraryManager:
                         item["path"],
                         item["acoustid"],
                         item["data"]["fingerprint"],
+                        item["data"]["duration"],
                         item["quality"],
                         item["data"]["hash"],
                         match,
@@ -1328,9 +2186,8 @@ class MusicLibraryManager:
                     )
 
         # --- CLEANUP ---
-        print("\nFinalizing database writes...")
-        self.db_queue.put(None)
-        self.writer_thread.join()
+        print("\nFinalizing file moves and database writes...")
+        self._finish_run()
 
         self.cleanup_empty_folders()
         print("\nProcessing complete!")
@@ -1340,6 +2197,7 @@ class MusicLibraryManager:
         path,
         current_acoustid_id,
         fingerprint,
+        duration,
         quality,
         audio_hash,
         selected_match,
@@ -1355,37 +2213,31 @@ class MusicLibraryManager:
         ):
             return
 
-        artist = (
-            rel.get("artists", [{}])[0].get("name")
-            or rec.get("artists", [{}])[0].get("name")
-            or "Unknown"
-        )
-        track_num, disc_num, found_track = 1, 1, False
-        target_title = str(rec.get("title", "")).lower().strip()
-
-        for medium in rel.get("mediums", []):
-            for track in medium.get("tracks", []):
-                if (
-                    str(track.get("recording", {}).get("id")) == str(rec.get("id"))
-                    or str(track.get("title", "")).lower().strip() == target_title
-                ):
-                    track_num, disc_num, found_track = (
-                        track.get("position", 1),
-                        medium.get("position", 1),
-                        True,
-                    )
-                    break
-            if found_track:
-                break
+        album_artist = _first_artist_name(rel)
+        artist = album_artist or _first_artist_name(rec) or "Unknown"
+        # Slimmed lookups and MusicBrainz candidates carry the position already;
+        # responses cached before slimming still have the full medium tree, and
+        # ones cached before the positions became strings still hold ints
+        if "track_no" in rel:
+            track_num, disc_num = str(rel["track_no"]), str(rel["disc_no"])
+            matched_by = rel.get("track_match", "id")
+        else:
+            track_num, disc_num, matched_by = _locate_track(rel, rec)
+        if matched_by == "title":
+            logger.warning(
+                f"Exact ID match failed for {path}. Used Title match fallback."
+            )
+        elif matched_by is None:
+            logger.warning(f"Could not find track number for {path}. Defaulting to 1.")
 
         meta = {
             "title": rec.get("title", "Unknown"),
             "album": rel.get("title", "Unknown Album"),
             "artist": artist,
-            "album_artist": rel.get("artists", [{}])[0].get("name") or artist,
+            "album_artist": album_artist or artist,
             "track_no": track_num,
             "disc_no": disc_num,
-            "release_date": str(rel.get("date", {}).get("year", "0000")),
+            "release_date": _release_year(rel, "0000"),
             "release_id": rel.get("id"),
         }
 
@@ -1393,7 +2245,7 @@ class MusicLibraryManager:
             meta["album_artist"]
         ), self._sanitize_name(meta["album"])
         safe_filename = self._sanitize_name(
-            f"{str(meta['track_no']).zfill(2)} - {meta['title']}{quality['format']}"
+            f"{meta['track_no'].zfill(2)} - {meta['title']}{quality['format']}"
         )
 
         final_path = self._organize_file(
@@ -1406,9 +2258,10 @@ class MusicLibraryManager:
         if not final_path:
             return
 
-        self._apply_tags(final_path, meta)
+        self._apply_tags(final_path, meta, quality["format"])
 
-        self.db_queue.put(
+        # The album, file row, hash and index rebuild land in one transaction
+        ops = [
             (
                 "execute",
                 "INSERT OR IGNORE INTO albums VALUES (?,?,?,?,?)",
@@ -1419,15 +2272,12 @@ class MusicLibraryManager:
                     meta["release_date"],
                     rel.get("country", "XX"),
                 ),
-            )
-        )
-
-        self.db_queue.put(
+            ),
             (
                 "execute",
                 """INSERT OR REPLACE INTO files 
-           (path, fingerprint, acoustid_id, title, track_no, disc_no, format, file_size, quality_score, album_id, processed, date_modified) 
-           VALUES (?,?,?,?,?,?,?,?,?,?,?, CURRENT_TIMESTAMP)""",
+           (path, fingerprint, acoustid_id, title, track_no, disc_no, format, file_size, quality_score, album_id, processed, date_modified, duration) 
+           VALUES (?,?,?,?,?,?,?,?,?,?,?, CURRENT_TIMESTAMP, ?)""",
                 (
                     final_path,
                     fingerprint,
@@ -1440,27 +2290,29 @@ class MusicLibraryManager:
                     quality["score"],
                     meta["release_id"],
                     1,
+                    duration,
                 ),
-            )
-        )
-
+            ),
+        ]
         if audio_hash:
-            self.db_queue.put(
+            ops.append(
                 (
                     "execute",
                     "INSERT OR REPLACE INTO audio_hashes (audio_hash, path) VALUES (?, ?)",
                     (audio_hash, final_path),
                 )
             )
+        ops.extend(self._index_ops(final_path, fingerprint))
+        self.db_queue.put(("batch", None, ops))
 
         # Update in-memory cache
         with self.cache_lock:
             self.audio_hash_cache[audio_hash] = final_path
+            self.score_cache[final_path] = quality["score"]
             if current_acoustid_id not in self.owned_ids_cache:
                 self.owned_ids_cache[current_acoustid_id] = set()
             self.owned_ids_cache[current_acoustid_id].add(rel.get("id"))
 
-        self._update_index(final_path, fingerprint)
         print(f" -> Success: {os.path.join(safe_artist, safe_album, safe_filename)}")
 
     def __del__(self):
@@ -1517,8 +2369,8 @@ if __name__ == "__main__":
         shutdown_event.set()
         print("\nProcess interrupted by user. Shutting down gracefully...")
     except Exception as e:
-        logging.error(f"Fatal error: {e}")
-        traceback.print_exc()
+        logger.exception(f"Fatal error: {e}")
+        print(f"Fatal error: {e} (traceback written to library_manager.log)")
     finally:
         shutdown_event.set()
         manager.close()
\ No newline at end of file